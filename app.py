@@ -1,9 +1,129 @@
-from flask import Flask, request, jsonify, render_template, send_file
-import pandas as pd
+import os
+import time
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, request, jsonify, render_template, send_file, make_response, abort
+import xlsxwriter
 from services.cnpj_ws import pesquisar_empresas
 
 app = Flask(__name__)
 
+EXCEL_PATH = "exports/empresas.xlsx"
+# Exportações reais rodam fora do request: o handler devolve um job_id e o
+# cliente consulta /status/<job_id> até o arquivo ficar pronto.
+executor = ThreadPoolExecutor(max_workers=int(os.getenv("EXPORT_WORKERS", "2")))
+# Jobs concluídos (e o .xlsx de cada um) ficam disponíveis por EXPORT_JOB_TTL segundos;
+# acima de EXPORT_MAX_JOBS, os concluídos mais antigos saem antes do prazo
+JOB_TTL = int(os.getenv("EXPORT_JOB_TTL", "3600"))
+MAX_JOBS = int(os.getenv("EXPORT_MAX_JOBS", "100"))
+jobs = {}       # job_id -> Future
+jobs_fim = {}   # job_id -> time.monotonic() de quando o job terminou
+jobs_lock = threading.Lock()
+# Atrás do nginx: prefixo de uma location "internal" que aponta para exports/
+# (ex.: /internal/exports/). O nginx serve o arquivo via sendfile(2).
+X_ACCEL_EXPORTS = os.getenv("X_ACCEL_EXPORTS")
+
+
+# Layout único das planilhas (simulada e real): as chaves que services.cnpj_ws projeta
+COLUNAS_EXCEL = ["cnpj", "razao_social", "nome_fantasia", "uf", "municipio",
+                 "situacao_cadastral", "porte", "cnae"]
+
+def abrir_planilha(caminho):
+    # Escreve direto com xlsxwriter (constant_memory grava linha a linha, sem DataFrame)
+    wb = xlsxwriter.Workbook(caminho, {"constant_memory": True})
+    ws = wb.add_worksheet()
+    ws.write_row(0, 0, COLUNAS_EXCEL)
+    return wb, ws
+
+def escrever_linhas(ws, empresas, linha_inicial):
+    """Grava as empresas a partir de linha_inicial; devolve a próxima linha livre."""
+    for i, emp in enumerate(empresas, start=linha_inicial):
+        ws.write_row(i, 0, [emp.get(c) for c in COLUNAS_EXCEL])
+    return linha_inicial + len(empresas)
+
+def exportar_excel(empresas, caminho=EXCEL_PATH):
+    wb, ws = abrir_planilha(caminho)
+    try:
+        escrever_linhas(ws, empresas, 1)
+    finally:
+        wb.close()
+
+def caminho_job(job_id):
+    return f"exports/empresas_{job_id}.xlsx"
+
+def registrar_job(job_id, future):
+    with jobs_lock:
+        jobs[job_id] = future
+    future.add_done_callback(lambda _f: marcar_fim(job_id))
+
+def marcar_fim(job_id):
+    with jobs_lock:
+        if job_id in jobs:
+            jobs_fim[job_id] = time.monotonic()
+
+def limpar_jobs():
+    """Descarta jobs concluídos vencidos (ou em excesso) e apaga a planilha de cada um."""
+    agora = time.monotonic()
+    with jobs_lock:
+        excesso = len(jobs) - MAX_JOBS
+        remover = []
+        for job_id in sorted(jobs_fim, key=jobs_fim.get):  # mais antigos primeiro
+            if agora - jobs_fim[job_id] > JOB_TTL or len(remover) < excesso:
+                remover.append(job_id)
+        for job_id in remover:
+            del jobs[job_id]
+            del jobs_fim[job_id]
+    for job_id in remover:
+        try:
+            os.remove(caminho_job(job_id))
+        except OSError:
+            pass  # job sem resultado não gerou planilha
+
+def executar_exportacao(filtros, max_paginas, job_id):
+    # Cada página da API vai direto para a planilha; em memória fica só a amostra
+    # devolvida para a tela
+    wb = ws = None
+    proxima_linha = 1
+    amostra = []
+
+    def gravar_pagina(empresas):
+        nonlocal wb, ws, proxima_linha
+        if wb is None:
+            wb, ws = abrir_planilha(caminho_job(job_id))
+        proxima_linha = escrever_linhas(ws, empresas, proxima_linha)
+        amostra.extend(empresas[:10 - len(amostra)])
+
+    try:
+        pesquisar_empresas(filtros, max_paginas=max_paginas, on_batch=gravar_pagina)
+    except Exception:
+        # falha no meio da paginação: a planilha parcial não pode sair como exportação completa
+        if wb is not None:
+            wb.close()
+            wb = None
+        try:
+            os.remove(caminho_job(job_id))
+        except OSError:
+            pass
+        raise
+    finally:
+        if wb is not None:
+            wb.close()
+
+    total = proxima_linha - 1
+    if not total:
+        return {
+            "status": "erro",
+            "mensagem": "Nenhum resultado encontrado com esses filtros."
+        }
+
+    return {
+        "status": "sucesso",
+        "mensagem": f"{total} empresas exportadas com sucesso!",
+        "arquivo": f"/baixar_excel?job={job_id}",
+        "empresas": amostra
+    }
+
 @app.route("/")
 def index():
     return render_template("index.html")
@@ -36,8 +156,7 @@ def gerar_excel():
             }
         ]
 
-        df = pd.DataFrame(empresas)
-        df.to_excel("exports/empresas.xlsx", index=False)
+        exportar_excel(empresas)
 
         return jsonify({
             "status": "sucesso",
@@ -66,28 +185,54 @@ def gerar_excel():
             filtros[chave] = valor
 
     max_paginas = int(request.args.get("max_paginas", 10))
-    empresas = pesquisar_empresas(filtros, max_paginas=max_paginas)
-
-    if not empresas:
-        return jsonify({
-            "status": "erro",
-            "mensagem": "Nenhum resultado encontrado com esses filtros."
-        })
-
-    df = pd.DataFrame(empresas)
-    df.to_excel("exports/empresas.xlsx", index=False)
+    limpar_jobs()
+    job_id = uuid.uuid4().hex
+    registrar_job(job_id, executor.submit(executar_exportacao, filtros, max_paginas, job_id))
 
     return jsonify({
-        "status": "sucesso",
-        "mensagem": f"{len(empresas)} empresas exportadas com sucesso!",
-        "arquivo": "/baixar_excel",
-        "empresas": empresas[:10]
+        "status": "running",
+        "job_id": job_id,
+        "mensagem": "Exportação em andamento…"
     })
-    
+
+@app.route("/status/<job_id>")
+def status(job_id):
+    limpar_jobs()
+    future = jobs.get(job_id)
+    if future is None:
+        return jsonify({"status": "erro", "mensagem": "Job não encontrado."}), 404
+    if not future.done():
+        return jsonify({"status": "running", "job_id": job_id})
+    if future.exception() is not None:
+        return jsonify({"status": "erro", "mensagem": f"Falha na exportação: {future.exception()}"})
+    return jsonify(future.result())
 
 @app.route("/baixar_excel")
 def baixar_excel():
-    return send_file("exports/empresas.xlsx", as_attachment=True)
+    job_id = request.args.get("job")
+    if job_id:
+        limpar_jobs()
+        future = jobs.get(job_id)
+        if future is None:
+            abort(404)  # job inexistente ou já descartado
+        if not future.done():
+            return jsonify({"status": "running", "mensagem": "Exportação ainda em andamento."}), 409
+        if future.exception() is not None:
+            return jsonify({"status": "erro", "mensagem": f"Falha na exportação: {future.exception()}"}), 500
+        caminho = caminho_job(job_id)
+        if not os.path.exists(caminho):
+            abort(404)  # job concluído sem resultados: não gerou planilha
+    else:
+        caminho = EXCEL_PATH
+
+    if X_ACCEL_EXPORTS:
+        nome = os.path.basename(caminho)
+        response = make_response("")
+        response.headers["X-Accel-Redirect"] = X_ACCEL_EXPORTS.rstrip("/") + "/" + nome
+        response.headers["Content-Disposition"] = f"attachment; filename={nome}"
+        return response
+    # conditional/etag: suporta Range e 304; o WSGI usa file_wrapper (sendfile) quando disponível
+    return send_file(caminho, as_attachment=True, conditional=True, etag=True, max_age=0)
 
 if __name__ == "__main__":
     app.run(debug=True)
\ No newline at end of file
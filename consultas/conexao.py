@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+# conexao.py
+# Conexão DuckDB e views sobre os .parquet, compartilhadas pelos scripts de consultas/.
+# Uso (de dentro de um script desta pasta):
+#   from conexao import conectar, criar_views, linhas, scan
+
+import os
+import duckdb
+
+def conectar(db: str = ":memory:", memory_limit: str = None):
+    if db != ":memory:":
+        os.makedirs(os.path.dirname(os.path.abspath(db)), exist_ok=True)
+    con = duckdb.connect(database=db)
+    # A ordem de saída vem do ORDER BY das consultas (ou não importa), então o DuckDB não
+    # precisa preservar a ordem de leitura. O object cache guarda os metadados dos Parquet entre consultas
+    con.execute("PRAGMA preserve_insertion_order=false")
+    con.execute("PRAGMA enable_object_cache=true")
+    if memory_limit:
+        con.execute(f"PRAGMA memory_limit='{memory_limit}'")
+    return con
+
+def scan(pattern: str, cols: list, opts: str = "") -> str:
+    # Projeção explícita no read_parquet: o scan só decodifica as colunas listadas
+    return f"SELECT {', '.join(cols)} FROM read_parquet('{pattern}'{opts})"
+
+def criar_views(con, views: dict):
+    # views: nome -> SELECT. As consultas referenciam só o nome da view;
+    # com --db em disco elas ficam gravadas no arquivo
+    for nome, sql in views.items():
+        con.execute(f"CREATE OR REPLACE VIEW {nome} AS {sql}")
+
+def linhas(cur) -> list:
+    # Resultados pequenos (impressos no log): fetchall + nomes das colunas, acesso por nome
+    cols = [d[0] for d in cur.description]
+    return [dict(zip(cols, r)) for r in cur.fetchall()]
@@ -3,21 +3,39 @@
 # Uso:
 #   pip install duckdb
 #   py ./consultas/consulta_cnpj_filtrada.py --parquet-dir data/cnpj_parquet --out exports/cnpjs_saude_uberlandia.csv --uf MG --municipio Uberlandia --limit 5000 --cnae 86 --porte 3 5 --situacao 8 --ativos
+#   py ./consultas/consulta_cnpj_filtrada.py --parquet-dir data/cnpj_parquet --cnae 8630501 8630503 --cnae-precise
 #
 # Observa: exige que seus .parquet usem nomes friendly (snake_case), por ex.:
 #   Empresas*: cnpj_basico, razao_social, ...
-#   Estabelecimentos*: cnpj_basico, cnpj_ordem, cnpj_dv, identificador_matriz_filial, uf, municipio, cnae_fiscal_principal, ...
+#   Estabelecimentos*: cnpj_basico, cnpj, identificador_matriz_filial, uf, municipio, cnae_fiscal_principal,
+#                      telefone1, telefone2, fax_completo, ... (cnpj/telefones pré-calculados na ingestão)
 #   Simples* (opcional): opcao_simples, opcao_mei, ...
 #   Municipios* (opcional): codigo, descricao
 #   Cnaes* (opcional): codigo, descricao
+# Gere os .parquet com scripts/cnpj_ingest_duckdb_v2.py: o filtro --cnae por prefixo exige
+# cnae_fiscal_principal numérico (INTEGER) e as colunas derivadas acima vêm de lá.
 
 import argparse
 import os
 import re
 import time
 from glob import glob
-import duckdb
-import shutil
+from conexao import conectar, criar_views, scan
+
+BOM = "\ufeff"  # UTF-8 BOM, gravado como EF BB BF
+INT_PATTERN = re.compile(r"\d+")
+
+# Projeção explícita em cada read_parquet: o scan só decodifica as colunas
+# que a consulta usa, em vez de materializar todas antes do SELECT externo
+COLS_EST = [
+    "cnpj_basico", "cnpj", "situacao_cadastral", "nome_fantasia",
+    "cnae_fiscal_principal", "data_inicio_atividade", "uf", "municipio",
+    "tipo_logradouro", "logradouro", "numero", "complemento", "bairro", "cep",
+    "telefone1", "telefone2", "fax_completo", "correio_eletronico",
+]
+COLS_EMP  = ["cnpj_basico", "razao_social", "porte_empresa"]
+COLS_SIM  = ["cnpj_basico", "opcao_simples", "opcao_mei"]
+COLS_DESC = ["codigo", "descricao"]  # Municipios* e Cnaes*
 
 def has_any(pattern: str) -> bool:
     return bool(glob(pattern))
@@ -26,15 +44,46 @@ def norm_str(s: str) -> str:
     return (s or "").strip()
 
 def is_intlike(s: str) -> bool:
-    return bool(re.fullmatch(r"\d+", s or ""))
+    return bool(INT_PATTERN.fullmatch(s or ""))
+
+def codigos_rfb(codes) -> list:
+    # Porte/situação são gravados como TINYINT pela ingestão; comparar a coluna
+    # crua (sem TRY_CAST) deixa o DuckDB usar as estatísticas do Parquet
+    return sorted(set(codes))
+
+def filtro_codigos(coluna: str, n: int) -> str:
+    # '=' quando há um só código; com mais, OR de igualdades (evita o IN (...) no scan)
+    if n == 1:
+        return f"{coluna} = ?"
+    return "(" + " OR ".join([f"{coluna} = ?"] * n) + ")"
+
+def filtro_cnae(coluna: str, n: int) -> str:
+    # CNAE é gravado como INTEGER (7 dígitos) pela ingestão: o prefixo de 2 dígitos
+    # vira uma faixa BETWEEN, que o DuckDB poda pelo min/max de cada row group
+    return "(" + " OR ".join([f"{coluna} BETWEEN ? AND ?"] * n) + ")"
+
+def faixa_cnae(prefixo: int) -> list:
+    # 86 -> [8600000, 8699999]; 1 (divisão 01) -> [100000, 199999]
+    return [prefixo * 100_000, (prefixo + 1) * 100_000 - 1]
 
 def main():
     ap = argparse.ArgumentParser(description="Consulta CNPJs em .parquet com filtros opcionais e exporta CSV (;).")
     ap.add_argument("--parquet-dir", required=True, help="Pasta com os .parquet (Empresas*, Estabelecimentos*, Simples*, Municipios*, Cnaes*).")
     ap.add_argument("--out", default="exports/cnpjs_filtrados.csv", help="Arquivo CSV de saída.")
+    ap.add_argument("--db", default=":memory:",
+                    help="Arquivo DuckDB para gravar as views sobre os .parquet (ex.: data/cnpj.duckdb). "
+                         "Padrão: :memory: (nada fica em disco e várias consultas rodam em paralelo).")
+    ap.add_argument("--memory-limit",
+                    help="Limite de memória do DuckDB (ex.: 8GB). Padrão: o do DuckDB (80%% da RAM).")
+    ap.add_argument("--hive-dir",
+                    help="Dataset de Estabelecimentos particionado por UF (scripts/particionar_estabelecimentos.py). "
+                         "Se informado, substitui os Estabelecimentos*.parquet da --parquet-dir.")
     ap.add_argument("--uf", help="Filtro de UF (ex.: MG).")
     ap.add_argument("--municipio", help="Filtro de município (nome ou código IBGE).")
-    ap.add_argument("--cnae", type=int, help="Ramo de atuação. Dois primeiros digitos do Cnae.")
+    ap.add_argument("--cnae", nargs="+", type=int,
+                    help="Ramo de atuação. Dois primeiros digitos do Cnae (ex.: --cnae 86 87).")
+    ap.add_argument("--cnae-precise", action="store_true",
+                    help="Se presente, --cnae recebe códigos completos de 7 dígitos (ex.: --cnae 8630503) e o filtro é exato.")
     ap.add_argument("--porte", nargs="+", type=int, choices=[0,1,3,5], default=[3,5],
                     help="Lista de códigos de porte (ex.: --porte 3 5). Válidos: 0,1,3,5. Default: 3 5")
     ap.add_argument("--situacao", nargs="+", type=int, choices=[1,2,3,4,8],
@@ -53,18 +102,22 @@ def main():
 
     print("▶️  Iniciando consulta…")
     print(f"   • Base Parquet : {parquet_dir}")
+    if args.hive_dir:
+        print(f"   • Estab. (Hive): {args.hive_dir}")
     print(f"   • Saída CSV    : {out_csv}")
 
     # Checagem de arquivos necessários
     emp_glob  = f"{parquet_dir}/Empresas*.parquet"
     est_glob  = f"{parquet_dir}/Estabelecimentos*.parquet"
+    if args.hive_dir:
+        est_glob = os.path.abspath(args.hive_dir).replace("\\", "/") + "/**/*.parquet"
     sim_glob  = f"{parquet_dir}/Simples*.parquet"
     mun_glob  = f"{parquet_dir}/Municipios*.parquet"
     cnae_glob = f"{parquet_dir}/Cnaes*.parquet"
 
     missing = []
     if not has_any(emp_glob): missing.append("Empresas*.parquet")
-    if not has_any(est_glob): missing.append("Estabelecimentos*.parquet")
+    if not has_any(est_glob): missing.append(est_glob if args.hive_dir else "Estabelecimentos*.parquet")
     if missing:
         raise SystemExit(f"❌ Arquivos obrigatórios ausentes: {', '.join(missing)}")
 
@@ -85,11 +138,9 @@ def main():
     municipio_raw = norm_str(args.municipio) if args.municipio else None
     municipio_is_code = is_intlike(municipio_raw) if municipio_raw else False
     lim = args.limit if (isinstance(args.limit, int) and args.limit > 0) else None
-    cnae = args.cnae if (isinstance(args.cnae, int) and args.cnae > 0) else None
-    porte_codes = sorted(set(args.porte or [3,5]))  # garante únicos/ordenados
-    placeholders_porte = ", ".join(["?"] * len(porte_codes))  # para o IN (?, ? , ...)
-    situacao_codes = sorted(set(args.situacao or [2]))  # garante únicos/ordenados
-    placeholders_situacao = ", ".join(["?"] * len(situacao_codes))  # para o IN (?, ? , ...)
+    cnae_codes = codigos_rfb(c for c in (args.cnae or []) if c > 0)
+    porte_codes = codigos_rfb(args.porte or [3,5])  # garante únicos/ordenados
+    situacao_codes = codigos_rfb(args.situacao or [2])  # garante únicos/ordenados
 
     print("🔎 Filtros aplicados:")
     print(f"   • UF           : {uf or '(sem)'}")
@@ -98,42 +149,47 @@ def main():
     else:
         print("   • Município    : (sem)")
     print(f"   • Limite       : {lim or '(sem)'}")
-    print(f"   • Cnae           : {cnae or '(sem)'}")
+    print(f"   • Cnae         : {', '.join(map(str, cnae_codes)) or '(sem)'}"
+          f"{' (exato)' if cnae_codes and args.cnae_precise else ''}")
     
 
     # Montagem dinâmica do SQL
-    join_sim = f"LEFT JOIN read_parquet('{sim_glob}') sim USING (cnpj_basico)" if has_sim else ""
+    # Códigos numéricos (INTEGER/SMALLINT na ingestão) filtram como inteiros, mas saem no CSV
+    # com os zeros à esquerda da RFB: CNAE 0111301 e município 0001, como no layout original
+    cnae_txt = "lpad(CAST(est.cnae_fiscal_principal AS VARCHAR), 7, '0')"
+    mun_txt = "lpad(CAST(est.municipio AS VARCHAR), 4, '0')"
+    join_sim = "LEFT JOIN simples sim USING (cnpj_basico)" if has_sim else ""
     if has_cnae:
-        join_cnae = f"""LEFT JOIN read_parquet('{cnae_glob}') cnae
-          ON TRY_CAST(est.cnae_fiscal_principal AS INTEGER) = cnae.codigo"""
-        sel_cnae = "est.cnae_fiscal_principal AS cnae_principal, cnae.descricao AS cnae_principal_nome"
+        join_cnae = """LEFT JOIN cnaes cnae
+          ON est.cnae_fiscal_principal = cnae.codigo"""
+        sel_cnae = f"{cnae_txt} AS cnae_principal, cnae.descricao AS cnae_principal_nome"
     else:
         join_cnae = ""
-        sel_cnae = "est.cnae_fiscal_principal AS cnae_principal, NULL AS cnae_principal_nome"
+        sel_cnae = f"{cnae_txt} AS cnae_principal, NULL AS cnae_principal_nome"
 
     if has_mun:
-        join_mun = f"""LEFT JOIN read_parquet('{mun_glob}') mun
-          ON TRY_CAST(est.municipio AS INTEGER) = mun.codigo"""
-        sel_mun = "est.municipio AS municipio_codigo, mun.descricao AS municipio_nome"
+        join_mun = """LEFT JOIN municipios mun
+          ON est.municipio = mun.codigo"""
+        sel_mun = f"{mun_txt} AS municipio_codigo, mun.descricao AS municipio_nome"
     else:
         join_mun = ""
-        sel_mun = "est.municipio AS municipio_codigo, NULL AS municipio_nome"
+        sel_mun = f"{mun_txt} AS municipio_codigo, NULL AS municipio_nome"
 
     where_clauses = []
     params = []
 
     if args.situacao:
-        where_clauses.append(f"TRY_CAST(est.situacao_cadastral AS INTEGER) IN ({placeholders_situacao})")
+        where_clauses.append(filtro_codigos("est.situacao_cadastral", len(situacao_codes)))
         params.extend(situacao_codes)
     if args.ativos and not args.situacao:
-        where_clauses.append("TRY_CAST(est.situacao_cadastral AS INTEGER) = 2")
+        where_clauses.append("est.situacao_cadastral = 2")
 
 
     if has_sim and args.opcao_sim:
         where_clauses.append("UPPER(COALESCE(sim.opcao_mei, 'N')) = 'S'")
 
     if uf:
-        where_clauses.append("UPPER(est.uf) = ?")
+        where_clauses.append("est.uf = ?")  # uf já normalizada em maiúsculas
         params.append(uf)
 
     if municipio_raw:
@@ -146,21 +202,28 @@ def main():
                 params.append(municipio_raw)
         else:
             # Sem Municipios*, só conseguimos filtrar se for código dentro de est.municipio
-            where_clauses.append("TRY_CAST(est.municipio AS INTEGER) = ?")
+            where_clauses.append("est.municipio = ?")
             params.append(int(municipio_raw))
 
-    if cnae:
-        where_clauses.append("LEFT(COALESCE(CAST(est.cnae_fiscal_principal AS VARCHAR),''),2)= ?")
-        params.append(int(cnae))
+    if cnae_codes:
+        if args.cnae_precise:
+            where_clauses.append(filtro_codigos("est.cnae_fiscal_principal", len(cnae_codes)))
+            params.extend(cnae_codes)
+        else:
+            where_clauses.append(filtro_cnae("est.cnae_fiscal_principal", len(cnae_codes)))
+            for c in cnae_codes:
+                params.extend(faixa_cnae(c))
     
-    where_clauses.append(f"TRY_CAST(emp.porte_empresa AS INTEGER) IN ({placeholders_porte})")
+    where_clauses.append(filtro_codigos("emp.porte_empresa", len(porte_codes)))
     params.extend(porte_codes)
 
     where_sql = ("WHERE " + " AND ".join(where_clauses)) if where_clauses else ""
 
     # SELECT base (colunas completas úteis)
+    # O BOM (utf-8-sig) vai no nome da 1ª coluna: com HEADER, o DuckDB já grava o arquivo
+    # começando por EF BB BF e o Excel reconhece UTF-8 sem uma segunda cópia do CSV
     select_cols = f"""
-        (est.cnpj_basico || est.cnpj_ordem || est.cnpj_dv) AS cnpj,
+        est.cnpj AS "{BOM}cnpj",
         emp.razao_social,
         COALESCE(est.nome_fantasia, emp.razao_social) AS nome_fantasia,
         {sel_cnae},
@@ -168,17 +231,15 @@ def main():
         est.uf,
         {sel_mun},
         est.tipo_logradouro, est.logradouro, est.numero, est.complemento, est.bairro, est.cep,
-        (COALESCE(est.ddd_1, '') || COALESCE(est.telefone_1, '')) AS telefone1,
-        (COALESCE(est.ddd_2, '') || COALESCE(est.telefone_2, '')) AS telefone2,
-        (COALESCE(est.ddd_fax, '') || COALESCE(est.fax, ''))      AS fax,
+        est.telefone1, est.telefone2, est.fax_completo AS fax,
         est.correio_eletronico AS email,
         {("COALESCE(sim.opcao_simples,'')" if has_sim else "''")} AS opcao_simples,
         {("COALESCE(sim.opcao_mei,'')"     if has_sim else "''")} AS opcao_mei
     """
 
     from_sql = f"""
-      FROM read_parquet('{est_glob}') est
-      JOIN read_parquet('{emp_glob}') emp USING (cnpj_basico)
+      FROM estabelecimentos est
+      JOIN empresas emp USING (cnpj_basico)
       {join_sim}
       {join_mun}
       {join_cnae}
@@ -192,18 +253,23 @@ def main():
     if lim:
         select_sql += " LIMIT ?"
 
-    # Gera primeiro em .tmp; depois adiciona BOM (utf-8-sig) para Excel
-    out_csv_tmp = out_csv + ".tmp"
-    out_csv_tmp_duck = out_csv_tmp.replace("\\", "/")
+    out_csv_duck = out_csv.replace("\\", "/")
 
     copy_sql = f"""
     COPY (
       {select_sql}
-    ) TO '{out_csv_tmp_duck}' (HEADER, DELIMITER ';');
+    ) TO '{out_csv_duck}' (HEADER, DELIMITER ';');
     """
 
     # Execução
-    con = duckdb.connect(database=":memory:")
+    con = conectar(args.db, args.memory_limit)
+    # Partição uf=XX no caminho (--hive-dir): o filtro por UF descarta diretórios antes de abrir arquivos
+    scan_est = scan(est_glob, COLS_EST, ", hive_partitioning = true" if args.hive_dir else "")
+    views = {"estabelecimentos": scan_est, "empresas": scan(emp_glob, COLS_EMP)}
+    if has_sim:  views["simples"] = scan(sim_glob, COLS_SIM)
+    if has_mun:  views["municipios"] = scan(mun_glob, COLS_DESC)
+    if has_cnae: views["cnaes"] = scan(cnae_glob, COLS_DESC)
+    criar_views(con, views)
 
     print("📦 Contando registros…")
     total = con.execute(count_sql, params).fetchone()[0]
@@ -213,12 +279,6 @@ def main():
     copy_params = params + ([lim] if lim else [])
     con.execute(copy_sql, copy_params)
 
-    # Prefixa BOM (UTF-8-SIG) sem carregar o arquivo todo na memória
-    with open(out_csv_tmp, "rb") as src, open(out_csv, "wb") as dst:
-        dst.write(b"\xef\xbb\xbf")  # BOM
-        shutil.copyfileobj(src, dst, length=1024 * 1024)
-    os.remove(out_csv_tmp)
-
     # Estatísticas
     exported = min(total, lim) if lim else total
     con.close()
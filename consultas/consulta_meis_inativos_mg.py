@@ -4,20 +4,38 @@
 #   pip install duckdb
 #   python contar_meis_inativos_mg_codigos.py --parquet-dir data/cnpj_parquet
 #   (opcional) --incluir-filiais  -> conta matriz + filiais
+#
+# Requer Estabelecimentos*.parquet gerado por scripts/cnpj_ingest_duckdb_v2.py
+# (coluna cnpj_full = CNPJ completo em BIGINT; situacao_cadastral e
+# identificador_matriz_filial como TINYINT).
 
 import argparse
 import os
 import time
 from glob import glob
-import duckdb
+from conexao import conectar, criar_views, linhas, scan
+
+SITUACOES = {2: "ATIVA", 3: "SUSPENSA", 4: "INAPTA", 8: "BAIXADA"}
 
 def has_any(pattern: str) -> bool:
     return bool(glob(pattern))
 
+# Colunas lidas de cada Parquet (projeção explícita: o scan ignora o resto)
+COLUNAS = {
+    "estabelecimentos": ["cnpj_basico", "cnpj_full", "uf", "situacao_cadastral",
+                         "identificador_matriz_filial"],
+    "simples": ["cnpj_basico", "opcao_mei"],
+}
+
 def main():
     ap = argparse.ArgumentParser(description="Conta MEIs inativos (códigos 3,4,8) em MG a partir de Parquet.")
     ap.add_argument("--parquet-dir", required=True, help="Pasta com os .parquet (Estabelecimentos*, Simples*).")
     ap.add_argument("--uf", default="MG", help="UF (padrão: MG).")
+    ap.add_argument("--db", default=":memory:",
+                    help="Arquivo DuckDB para gravar as views sobre os .parquet (ex.: data/cnpj.duckdb). "
+                         "Padrão: :memory: (nada fica em disco e várias consultas rodam em paralelo).")
+    ap.add_argument("--memory-limit",
+                    help="Limite de memória do DuckDB (ex.: 8GB). Padrão: o do DuckDB (80%% da RAM).")
     ap.add_argument("--incluir-filiais", action="store_true",
                     help="Se setado, conta matriz + filiais; por padrão conta somente a matriz (identificador=1).")
     args = ap.parse_args()
@@ -43,52 +61,47 @@ def main():
     print(f"   • Critérios    : MEI='S', situacao_cadastral ∈ {{3=SUSPENSA, 4=INAPTA, 8=BAIXADA}}, "
           f"{'somente matriz' if somente_matriz else 'matriz + filiais'}")
 
-    filtro_matriz = "AND TRY_CAST(est.identificador_matriz_filial AS INTEGER) = 1" if somente_matriz else ""
+    filtro_matriz = "AND est.identificador_matriz_filial = 1" if somente_matriz else ""
 
     # FROM + WHERE comum
     from_where = f"""
-      FROM read_parquet('{est_glob}') est
-      JOIN read_parquet('{sim_glob}') sim USING (cnpj_basico)
+      FROM estabelecimentos est
+      JOIN simples sim USING (cnpj_basico)
       WHERE UPPER(est.uf) = '{uf}'
         AND UPPER(COALESCE(sim.opcao_mei, 'N')) = 'S'
-        AND TRY_CAST(est.situacao_cadastral AS INTEGER) IN (3,4,8)
+        AND est.situacao_cadastral IN (3,4,8)
         {filtro_matriz}
     """
 
-    # Total de CNPJs distintos (considerando apenas matriz por padrão)
-    total_sql = f"""
-      SELECT COUNT(DISTINCT (est.cnpj_basico || est.cnpj_ordem || est.cnpj_dv)) AS total_meis_inativos
-      {from_where}
-    """
-
-    # Breakdown por código + label
+    # Breakdown por código + total numa passada só: a linha extra do ROLLUP
+    # (GROUPING(codigo) = 1) traz o total de CNPJs distintos.
+    # A descrição é resolvida em Python: no máximo 3 linhas
     by_code_sql = f"""
       SELECT
-        TRY_CAST(est.situacao_cadastral AS INTEGER) AS codigo,
-        CASE TRY_CAST(est.situacao_cadastral AS INTEGER)
-          WHEN 2 THEN 'ATIVA'
-          WHEN 3 THEN 'SUSPENSA'
-          WHEN 4 THEN 'INAPTA'
-          WHEN 8 THEN 'BAIXADA'
-          ELSE COALESCE(CAST(est.situacao_cadastral AS VARCHAR), '(DESCONHECIDA)')
-        END AS descricao,
+        est.situacao_cadastral AS codigo,
         COUNT(*) AS registros,
-        COUNT(DISTINCT (est.cnpj_basico || est.cnpj_ordem || est.cnpj_dv)) AS cnpjs_distintos
+        COUNT(DISTINCT est.cnpj_full) AS cnpjs_distintos,
+        GROUPING(codigo) AS is_total
       {from_where}
-      GROUP BY 1,2
-      ORDER BY registros DESC
+      GROUP BY ROLLUP (codigo)
+      ORDER BY is_total DESC, registros DESC
     """
 
-    con = duckdb.connect(database=":memory:")
+    con = conectar(args.db, args.memory_limit)
+    criar_views(con, {"estabelecimentos": scan(est_glob, COLUNAS["estabelecimentos"]),
+                       "simples": scan(sim_glob, COLUNAS["simples"])})
 
-    total = con.execute(total_sql).fetchone()[0]
+    rows = linhas(con.execute(by_code_sql))
+    total = rows[0]["cnpjs_distintos"]  # linha do ROLLUP (sempre presente, mesmo sem registros)
+    rows = rows[1:]
     print("📊 Resultado")
     print(f"   • MEIs inativos ({uf}) : {total:,}".replace(",", "."))
 
-    rows = con.execute(by_code_sql).fetchall()
     if rows:
         print("   • Por código/descrição:")
-        for codigo, desc, registros, cnpjs in rows:
+        for r in rows:
+            codigo, registros, cnpjs = r["codigo"], r["registros"], r["cnpjs_distintos"]
+            desc = SITUACOES.get(codigo, "(DESCONHECIDA)")
             print(f"     - {codigo:>2} – {desc:<8}  registros={registros:,}  cnpjs={cnpjs:,}".replace(",", "."))
 
     con.close()
@@ -1,6 +1,8 @@
 #!/usr/bin/env python3
+import os
 import duckdb
 import argparse
+from glob import glob
 
 # --- parser de argumentos
 parser = argparse.ArgumentParser(description="Descreve colunas dos Parquet")
@@ -26,13 +28,30 @@ for base in bases:
     base = base.strip()
     if not base:
         continue
-    sql = f"""
-        DESCRIBE 
-        SELECT * 
-        FROM read_parquet('{args.parquet_dir}/{base}*.parquet') 
-        LIMIT 0
-    """
-    rows = con.execute(sql).fetchall()
-    print(f"\n=== {base} ===")
+    arquivos = sorted(glob(os.path.join(args.parquet_dir, f"{base}*.parquet")))
+    if not arquivos:
+        print(f"\n=== {base} === (nenhum .parquet encontrado)")
+        continue
+    # parquet_schema lê só os rodapés, mas de TODOS os arquivos da base: um arquivo com
+    # layout diferente (ingestão parcial, versão antiga) aparece aqui em vez de só na consulta
+    padrao = os.path.join(args.parquet_dir, f"{base}*.parquet").replace("\\", "/")
+    schemas = {}
+    for file_name, name, tipo in con.execute(f"""
+        SELECT file_name, name, type
+        FROM parquet_schema('{padrao}')
+        WHERE type IS NOT NULL  -- pula o nó raiz (duckdb_schema/schema)
+    """).fetchall():
+        schemas.setdefault(file_name, []).append((name, tipo))
+    referencia = schemas[min(schemas)]  # o 1º arquivo em ordem alfabética, o mesmo do DESCRIBE
+    divergentes = [f for f, cols in schemas.items() if cols != referencia]
+
+    # DESCRIBE mostra os tipos lógicos do DuckDB (VARCHAR, TINYINT…), os que se usam nas consultas
+    primeiro = arquivos[0].replace("\\", "/")
+    rows = con.execute(f"DESCRIBE SELECT * FROM read_parquet('{primeiro}')").fetchall()
+    print(f"\n=== {base} === ({len(schemas)} arquivo(s))")
     for row in rows:
         print(row)
+    if divergentes:
+        print(f"⚠️  {len(divergentes)} arquivo(s) com colunas diferentes de {os.path.basename(primeiro)}:")
+        for f in divergentes:
+            print(f"   - {os.path.basename(f)}: {', '.join(f'{n}:{t}' for n, t in schemas[f])}")
@@ -3,35 +3,71 @@
 # Uso:
 #   pip install duckdb
 #   python consulta_cnpj_parquet.py --parquet-dir data/cnpj_parquet --cnpj 12.345.678/0001-90
+#
+# Dica: rode antes scripts/ordenar_por_cnpj_basico.py nos Parquet — a busca por
+# cnpj_basico passa a ler só o row group que contém o CNPJ (Empresas/Simples/Socios;
+# Estabelecimentos só com --incluir-estabelecimentos).
 
 import argparse
 import os
 import re
 from glob import glob
-import duckdb
+from conexao import conectar, criar_views, linhas, scan
+
+NON_DIGIT_PATTERN = re.compile(r"\D")
 
 def only_digits(s: str) -> str:
-    return re.sub(r"\D", "", s or "")
+    # Já só com dígitos (caso comum em lote): devolve sem passar pelo regex
+    if s and s.isascii() and s.isdigit():
+        return s
+    return NON_DIGIT_PATTERN.sub("", s or "")
+
+# Pesos dos dígitos verificadores (módulo 11), montados uma vez só
+PESOS_DV1 = (5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2)
+PESOS_DV2 = (6,) + PESOS_DV1
 
 def valida_cnpj(cnpj: str) -> bool:
     c = only_digits(cnpj)
     if len(c) != 14 or len(set(c)) == 1:
         return False
-    pesos1 = [5,4,3,2,9,8,7,6,5,4,3,2]
-    soma1 = sum(int(d)*p for d,p in zip(c[:12], pesos1))
-    dv1 = 0 if soma1 % 11 < 2 else 11 - (soma1 % 11)
-    pesos2 = [6]+pesos1
-    soma2 = sum(int(d)*p for d,p in zip(c[:13], pesos2))
-    dv2 = 0 if soma2 % 11 < 2 else 11 - (soma2 % 11)
-    return c[-2:] == f"{dv1}{dv2}"
+    d = tuple(map(int, c))
+    soma1 = sum(x * p for x, p in zip(d, PESOS_DV1)) % 11
+    dv1 = 0 if soma1 < 2 else 11 - soma1
+    soma2 = sum(x * p for x, p in zip(d, PESOS_DV2)) % 11
+    dv2 = 0 if soma2 < 2 else 11 - soma2
+    return d[12] == dv1 and d[13] == dv2
 
 def exists_any(pattern: str) -> bool:
     return bool(glob(pattern))
 
+# Colunas lidas de cada Parquet: a projeção explícita no read_parquet evita
+# decodificar as colunas que a consulta não imprime
+COLUNAS = {
+    "empresas": ["cnpj_basico", "razao_social", "natureza_juridica", "porte_empresa",
+                 "capital_social_empresa"],
+    "estabelecimentos": ["cnpj_basico", "cnpj_ordem", "cnpj_dv", "identificador_matriz_filial",
+                         "nome_fantasia", "cnae_fiscal_principal", "cnae_fiscal_secundaria",
+                         "data_inicio_atividade", "situacao_cadastral", "tipo_logradouro",
+                         "logradouro", "numero", "complemento", "bairro", "cep", "uf", "municipio",
+                         "ddd_1", "telefone_1", "ddd_2", "telefone_2", "ddd_fax", "fax",
+                         "correio_eletronico"],
+    "simples": ["cnpj_basico", "opcao_simples", "data_opcao_simples", "data_exclusao_simples",
+                "opcao_mei", "data_opcao_mei", "data_exclusao_mei"],
+    "municipios": ["codigo", "descricao"],
+    "socios": ["cnpj_basico", "identificador_socio", "nome_socio_ou_razao_social", "cnpj_cpf_socio",
+               "qualificacao_socio", "data_entrada_sociedade", "pais", "representante_legal",
+               "nome_representante", "qualificacao_representante_legal", "faixa_etaria"],
+}
+
 def main():
     ap = argparse.ArgumentParser(description="Consulta um CNPJ nos arquivos .parquet e imprime os dados no log.")
     ap.add_argument("--parquet-dir", required=True, help="Pasta contendo os .parquet (Empresas*, Estabelecimentos*, Simples*, Municipios*, Socios*).")
     ap.add_argument("--cnpj", required=True, help="CNPJ (com ou sem pontuação).")
+    ap.add_argument("--db", default=":memory:",
+                    help="Arquivo DuckDB para gravar as views sobre os .parquet (ex.: data/cnpj.duckdb). "
+                         "Padrão: :memory: (nada fica em disco e várias consultas rodam em paralelo).")
+    ap.add_argument("--memory-limit",
+                    help="Limite de memória do DuckDB (ex.: 8GB). Padrão: o do DuckDB (80%% da RAM).")
     args = ap.parse_args()
 
     base = os.path.abspath(args.parquet_dir).replace("\\", "/")
@@ -56,74 +92,48 @@ def main():
     if missing:
         raise SystemExit(f"❌ Arquivos ausentes para consulta: {missing}. Verifique a pasta: {base}")
 
-    con = duckdb.connect(database=":memory:")
-
-    # ---------------- Empresa (1 linha) ----------------
-    q_emp = f"""
-    SELECT DISTINCT
-        emp.cnpj_basico,
-        emp.razao_social,
-        emp.natureza_juridica,
-        emp.porte_empresa,
-        emp.capital_social_empresa
-    FROM read_parquet('{base}/Empresas*.parquet') emp
-    JOIN read_parquet('{base}/Estabelecimentos*.parquet') est USING (cnpj_basico)
-    WHERE est.cnpj_basico = ? AND est.cnpj_ordem = ? AND est.cnpj_dv = ?
-    """
-    emp = con.execute(q_emp, [cnpj_basico, cnpj_ordem, cnpj_dv]).fetchone()
-
-    if not emp:
-        con.close()
-        raise SystemExit("❌ CNPJ não encontrado nos Parquet (verifique nomes/paths ou padrão de colunas).")
-
-    print("\n===================== EMPRESA =====================")
-    print(f"CNPJ: {cnpj_basico}.{cnpj_ordem}/{cnpj_dv}")
-    print(f"Razão social           : {emp[1]}")
-    print(f"Natureza jurídica      : {emp[2]}")
-    print(f"Porte                  : {emp[3]}")
-    print(f"Capital social (R$)    : {emp[4]}")
-
-    # ---------------- Simples/MEI (1 linha, se existir) ----------------
-    if exists_any(need["sim"]):
-        q_sim = f"""
-        SELECT
-            COALESCE(sim.opcao_simples,'N')         AS opcao_simples,
-            sim.data_opcao_simples,
-            sim.data_exclusao_simples,
-            COALESCE(sim.opcao_mei,'N')             AS opcao_mei,
-            sim.data_opcao_mei,
-            sim.data_exclusao_mei
-        FROM read_parquet('{base}/Simples*.parquet') sim
-        WHERE sim.cnpj_basico = ?
-        """
-        sim = con.execute(q_sim, [cnpj_basico]).fetchone()
-        if sim:
-            print("\n------------------- SIMPLES / MEI ------------------")
-            print(f"Opção pelo Simples     : {sim[0]}")
-            print(f"Data opção Simples     : {sim[1]}")
-            print(f"Data exclusão Simples  : {sim[2]}")
-            print(f"Opção pelo MEI         : {sim[3]}")
-            print(f"Data opção MEI         : {sim[4]}")
-            print(f"Data exclusão MEI      : {sim[5]}")
-
-    # ---------------- Estabelecimentos (N linhas) ----------------
+    con = conectar(args.db, args.memory_limit)
+    nomes = {"emp": "empresas", "est": "estabelecimentos", "sim": "simples", "mun": "municipios", "soc": "socios"}
+    criar_views(con, {nomes[k]: scan(p, COLUNAS[nomes[k]]) for k, p in need.items() if exists_any(p)})
+
+    # ---------------- Empresa + Simples + Estabelecimentos (1 consulta) ----------------
+    # Uma passada só pelos Parquet: cada linha é um estabelecimento, com as colunas da
+    # empresa e do Simples repetidas (sócios continuam numa consulta à parte)
+    has_sim = exists_any(need["sim"])
+    join_sim = "LEFT JOIN simples sim USING (cnpj_basico)" if has_sim else ""
+    sel_sim = """
+        sim.cnpj_basico IS NOT NULL             AS tem_simples,
+        COALESCE(sim.opcao_simples,'N')         AS opcao_simples,
+        sim.data_opcao_simples,
+        sim.data_exclusao_simples,
+        COALESCE(sim.opcao_mei,'N')             AS opcao_mei,
+        sim.data_opcao_mei,
+        sim.data_exclusao_mei""" if has_sim else "FALSE AS tem_simples"
+
+    # Códigos numéricos nos Parquet v2: zero à esquerda como na Receita (CNAE 7, município 4, ...)
+    mun_txt = "lpad(CAST(est.municipio AS VARCHAR), 4, '0')"
     join_mun = ""
-    sel_mun  = "est.municipio AS municipio_codigo, NULL AS municipio_nome"
+    sel_mun  = f"{mun_txt} AS municipio_codigo, NULL AS municipio_nome"
     if exists_any(need["mun"]):
-        join_mun = f"""
-        LEFT JOIN read_parquet('{base}/Municipios*.parquet') mun
-          ON TRY_CAST(est.municipio AS INTEGER) = mun.codigo
+        join_mun = """
+        LEFT JOIN municipios mun
+          ON est.municipio = mun.codigo
         """
-        sel_mun = "est.municipio AS municipio_codigo, mun.descricao AS municipio_nome"
+        sel_mun = f"{mun_txt} AS municipio_codigo, mun.descricao AS municipio_nome"
 
-    q_est = f"""
+    q_cnpj = f"""
     SELECT
+        emp.razao_social,
+        emp.natureza_juridica,
+        lpad(CAST(emp.porte_empresa AS VARCHAR), 2, '0') AS porte_empresa,
+        emp.capital_social_empresa,
+        {sel_sim},
         est.identificador_matriz_filial,
         est.nome_fantasia,
-        est.cnae_fiscal_principal,
+        lpad(CAST(est.cnae_fiscal_principal AS VARCHAR), 7, '0') AS cnae_fiscal_principal,
         est.cnae_fiscal_secundaria,
         est.data_inicio_atividade,
-        est.situacao_cadastral,
+        lpad(CAST(est.situacao_cadastral AS VARCHAR), 2, '0') AS situacao_cadastral,
         est.tipo_logradouro,
         est.logradouro,
         est.numero,
@@ -134,36 +144,58 @@ def main():
         {sel_mun},
         est.ddd_1, est.telefone_1, est.ddd_2, est.telefone_2, est.ddd_fax, est.fax,
         est.correio_eletronico
-    FROM read_parquet('{base}/Estabelecimentos*.parquet') est
+    FROM estabelecimentos est
+    JOIN empresas emp USING (cnpj_basico)
+    {join_sim}
     {join_mun}
     WHERE est.cnpj_basico = ? AND est.cnpj_ordem = ? AND est.cnpj_dv = ?
-    ORDER BY TRY_CAST(est.identificador_matriz_filial AS INTEGER) NULLS LAST, est.data_inicio_atividade
+    ORDER BY est.identificador_matriz_filial NULLS LAST, est.data_inicio_atividade
     """
-    est_rows = con.execute(q_est, [cnpj_basico, cnpj_ordem, cnpj_dv]).fetchall()
+    est_rows = linhas(con.execute(q_cnpj, [cnpj_basico, cnpj_ordem, cnpj_dv]))
 
-    print("\n================= ESTABELECIMENTOS =================")
     if not est_rows:
-        print("(Sem estabelecimentos)")
+        con.close()
+        raise SystemExit("❌ CNPJ não encontrado nos Parquet (verifique nomes/paths ou padrão de colunas).")
+
+    emp = est_rows[0]
+    print("\n===================== EMPRESA =====================")
+    print(f"CNPJ: {cnpj_basico}.{cnpj_ordem}/{cnpj_dv}")
+    print(f"Razão social           : {emp['razao_social']}")
+    print(f"Natureza jurídica      : {emp['natureza_juridica']}")
+    print(f"Porte                  : {emp['porte_empresa']}")
+    print(f"Capital social (R$)    : {emp['capital_social_empresa']}")
+
+    if emp["tem_simples"]:
+        print("\n------------------- SIMPLES / MEI ------------------")
+        print(f"Opção pelo Simples     : {emp['opcao_simples']}")
+        print(f"Data opção Simples     : {emp['data_opcao_simples']}")
+        print(f"Data exclusão Simples  : {emp['data_exclusao_simples']}")
+        print(f"Opção pelo MEI         : {emp['opcao_mei']}")
+        print(f"Data opção MEI         : {emp['data_opcao_mei']}")
+        print(f"Data exclusão MEI      : {emp['data_exclusao_mei']}")
+
+    print("\n================= ESTABELECIMENTOS =================")
     for i, r in enumerate(est_rows, 1):
-        (id_mf, nome_fantasia, cnae_pri, cnae_sec, dt_ini, sit, tipo_log, lograd, numero,
-         compl, bairro, cep, uf, mun_cod, mun_nome, ddd1, tel1, ddd2, tel2, dddfax, fax, email) = r
+        id_mf = r["identificador_matriz_filial"]
         tag = "MATRIZ" if str(id_mf) == "1" else ("FILIAL" if str(id_mf) == "2" else str(id_mf))
-        fone1 = (ddd1 or "") + (tel1 or "")
-        fone2 = (ddd2 or "") + (tel2 or "")
-        fax_c = (dddfax or "") + (fax or "")
+        fone1 = (r["ddd_1"] or "") + (r["telefone_1"] or "")
+        fone2 = (r["ddd_2"] or "") + (r["telefone_2"] or "")
+        fax_c = (r["ddd_fax"] or "") + (r["fax"] or "")
         print(f"\n--- Estab. {i} [{tag}] ---")
-        print(f"Nome fantasia          : {nome_fantasia}")
-        print(f"CNAE principal         : {cnae_pri}")
-        print(f"CNAEs secundárias      : {cnae_sec}")
-        print(f"Início atividade       : {dt_ini}")
-        print(f"Situação cadastral     : {sit}")
-        print(f"Endereço               : {tipo_log or ''} {lograd or ''}, {numero or ''} {compl or ''} - {bairro or ''}")
-        print(f"CEP/UF/Mun             : {cep or ''} / {uf or ''} / {mun_nome or mun_cod or ''}")
-        print(f"Contatos               : tel1={fone1} tel2={fone2} fax={fax_c} email={email or ''}")
+        print(f"Nome fantasia          : {r['nome_fantasia']}")
+        print(f"CNAE principal         : {r['cnae_fiscal_principal']}")
+        print(f"CNAEs secundárias      : {r['cnae_fiscal_secundaria']}")
+        print(f"Início atividade       : {r['data_inicio_atividade']}")
+        print(f"Situação cadastral     : {r['situacao_cadastral']}")
+        print(f"Endereço               : {r['tipo_logradouro'] or ''} {r['logradouro'] or ''}, "
+              f"{r['numero'] or ''} {r['complemento'] or ''} - {r['bairro'] or ''}")
+        print(f"CEP/UF/Mun             : {r['cep'] or ''} / {r['uf'] or ''} / "
+              f"{r['municipio_nome'] or r['municipio_codigo'] or ''}")
+        print(f"Contatos               : tel1={fone1} tel2={fone2} fax={fax_c} email={r['correio_eletronico'] or ''}")
 
     # ---------------- Sócios (opcional) ----------------
     if exists_any(need["soc"]):
-        q_soc = f"""
+        q_soc = """
         SELECT
             s.identificador_socio,
             s.nome_socio_ou_razao_social,
@@ -175,24 +207,24 @@ def main():
             s.nome_representante,
             s.qualificacao_representante_legal,
             s.faixa_etaria
-        FROM read_parquet('{base}/Socios*.parquet') s
+        FROM socios s
         WHERE s.cnpj_basico = ?
         ORDER BY s.nome_socio_ou_razao_social
         """
-        socios = con.execute(q_soc, [cnpj_basico]).fetchall()
+        socios = linhas(con.execute(q_soc, [cnpj_basico]))
         if socios:
             print("\n======================= SÓCIOS ======================")
             for j, s in enumerate(socios, 1):
-                (id_s, nome, doc, qual, dt_ent, pais, rep, nome_rep, qual_rep, faixa) = s
                 print(f"\n- Sócio {j}")
-                print(f"  Identificador        : {id_s}")
-                print(f"  Nome/Razão           : {nome}")
-                print(f"  Documento            : {doc}")
-                print(f"  Qualificação         : {qual}")
-                print(f"  Entrada sociedade    : {dt_ent}")
-                print(f"  País                 : {pais}")
-                print(f"  Representante legal  : {rep} - {nome_rep} ({qual_rep})")
-                print(f"  Faixa etária         : {faixa}")
+                print(f"  Identificador        : {s['identificador_socio']}")
+                print(f"  Nome/Razão           : {s['nome_socio_ou_razao_social']}")
+                print(f"  Documento            : {s['cnpj_cpf_socio']}")
+                print(f"  Qualificação         : {s['qualificacao_socio']}")
+                print(f"  Entrada sociedade    : {s['data_entrada_sociedade']}")
+                print(f"  País                 : {s['pais']}")
+                print(f"  Representante legal  : {s['representante_legal']} - {s['nome_representante']} "
+                      f"({s['qualificacao_representante_legal']})")
+                print(f"  Faixa etária         : {s['faixa_etaria']}")
 
     con.close()
     print("\n✅ Consulta finalizada.")
@@ -4,10 +4,23 @@
 #   python consulta_saude_uberlandia.py --parquet-dir data/cnpj_parquet --out exports/saude_uberlandia_600k.csv
 #
 # Requer: Empresas*, Estabelecimentos*, (opcional) Simples*, Municipios*, Cnaes*
+# gerados por scripts/cnpj_ingest_duckdb_v2.py (códigos numéricos já tipados: municipio,
+# cnae_fiscal_principal, identificador_matriz_filial, porte_empresa...).
 
-import argparse, os, time, shutil
+import argparse, os, time
 from glob import glob
-import duckdb
+from conexao import conectar, criar_views, scan
+
+# Colunas lidas de cada Parquet: só o que o SELECT/WHERE usam (o resto nem é decodificado)
+COLS_EST = ["cnpj_basico", "cnpj", "identificador_matriz_filial", "nome_fantasia",
+            "situacao_cadastral", "data_inicio_atividade", "cnae_fiscal_principal", "tipo_logradouro",
+            "logradouro", "numero", "complemento", "bairro", "cep", "uf", "municipio",
+            "telefone1", "telefone2", "correio_eletronico"]
+COLS_EMP  = ["cnpj_basico", "razao_social", "porte_empresa"]
+COLS_SIM  = ["cnpj_basico", "opcao_mei"]
+COLS_DESC = ["codigo", "descricao"]  # Municipios* e Cnaes*
+
+BOM = "\ufeff"  # UTF-8 BOM, gravado como EF BB BF
 
 def has_any(pat): return bool(glob(pat))
 
@@ -16,6 +29,7 @@ def main():
     ap.add_argument("--parquet-dir", required=True)
     ap.add_argument("--out", default="exports/saude_uberlandia_600k.csv")
     ap.add_argument("--incluir-filiais", action="store_true", help="Se setado, inclui filiais (padrão: só matriz).")
+    ap.add_argument("--memory-limit", help="Limite de memória do DuckDB (ex.: 12GB). Padrão: o do DuckDB (80%% da RAM).")
     args = ap.parse_args()
 
     t0 = time.perf_counter()
@@ -44,36 +58,31 @@ def main():
     print(f"   • Tabelas : Simples={'sim' if has_sim else 'não'}  Municipios={'sim' if has_mun else 'não'}  Cnaes={'sim' if has_cnae else 'não'}")
 
     # JOINs opcionais
-    join_sim  = f"LEFT JOIN read_parquet('{sim_glob}') sim USING (cnpj_basico)" if has_sim else ""
-    join_mun  = f"LEFT JOIN read_parquet('{mun_glob}') mun ON TRY_CAST(est.municipio AS INTEGER)=TRY_CAST(mun.codigo AS INTEGER)" if has_mun else ""
-    join_cnae = f"LEFT JOIN read_parquet('{cnae_glob}') cnae ON TRY_CAST(est.cnae_fiscal_principal AS INTEGER)=TRY_CAST(cnae.codigo AS INTEGER)" if has_cnae else ""
+    join_sim  = "LEFT JOIN simples sim USING (cnpj_basico)" if has_sim else ""
+    # Municipios/Cnaes são pequenos (~5,5 mil e ~1,3 mil linhas): viram tabelas em memória
+    # (ver abaixo) e o JOIN é só um probe no hash, sem abrir Parquet de novo
+    join_mun  = "LEFT JOIN municipios mun ON est.municipio=mun.codigo" if has_mun else ""
+    join_cnae = "LEFT JOIN cnaes cnae ON est.cnae_fiscal_principal=cnae.codigo" if has_cnae else ""
 
     # Filtros:
-    filtro_matriz = "" if args.incluir_filiais else "AND TRY_CAST(est.identificador_matriz_filial AS INTEGER)=1"
+    filtro_matriz = "" if args.incluir_filiais else "AND est.identificador_matriz_filial=1"
     filtro_mei    = "AND UPPER(COALESCE(sim.opcao_mei,'N'))<>'S'" if has_sim else ""  # exclui MEI se info existir
 
-    # Proxy de porte para >~600k: EPP e acima (texto ou código). Seu dataset tem 'porte_empresa' (VARCHAR).
-    filtro_porte = """
-      AND (
-            TRY_CAST(emp.porte_empresa AS INTEGER) IN (3,5)   -- se vier número em algum dataset
-      )
-    """
+    # Proxy de porte para >~600k: EPP (3) e DEMAIS (5). porte_empresa já vem TINYINT do ingest v2,
+    # então o IN compara direto (sem TRY_CAST por linha) e aproveita o min/max dos row groups
+    filtro_porte = "AND emp.porte_empresa IN (3,5)"
 
-    # Uberlândia/MG (5403). Se não houver Municipios*, filtra por código em est.municipio + UF.
-    filtro_municipio = """
-      WHERE UPPER(est.uf)='MG' AND (
-        TRY_CAST(est.municipio AS INTEGER)=5403
-        OR (COALESCE(mun.codigo,'') <> '' AND TRY_CAST(mun.codigo AS INTEGER)=5403)
-      )
-    """
+    # Uberlândia/MG (5403): filtra pelo código em est.municipio (não depende de Municipios*)
+    filtro_municipio = "WHERE est.uf='MG' AND est.municipio=5403"
 
-    # Saúde: CNAE principal começando com 86
-    filtro_cnae86 = "AND LEFT(COALESCE(CAST(est.cnae_fiscal_principal AS VARCHAR),''),2)='86'"
+    # Saúde: CNAE principal começando com 86. Faixa sobre a coluna crua (INTEGER, 7 dígitos):
+    # o DuckDB poda pelo min/max dos row groups, o que LEFT(CAST(...)) impedia
+    filtro_cnae86 = "AND est.cnae_fiscal_principal BETWEEN 8600000 AND 8699999"
 
     # FROM + WHERE final
     from_where = f"""
-      FROM read_parquet('{est_glob}') est
-      JOIN read_parquet('{emp_glob}') emp USING (cnpj_basico)
+      FROM estabelecimentos est
+      JOIN empresas emp USING (cnpj_basico)
       {join_sim}
       {join_mun}
       {join_cnae}
@@ -89,45 +98,44 @@ def main():
                  "OR UPPER(COALESCE(cnae.descricao,'')) LIKE '%CLINIC%') "
                  "THEN 'CLINICA' ELSE 'OUTROS_SAUDE' END") if has_cnae else "'SAUDE'"
 
+    # porte/situação/município/CNAE são inteiros na ingestão (filtros acima comparam números);
+    # no CSV voltam com os zeros à esquerda da RFB (porte 03, situação 02, CNAE 0111301…)
     select_sql = f"""
       SELECT
-        (est.cnpj_basico || est.cnpj_ordem || est.cnpj_dv) AS cnpj,
+        est.cnpj AS "{BOM}cnpj",
         emp.razao_social,
         COALESCE(est.nome_fantasia, emp.razao_social) AS nome_fantasia,
-        emp.porte_empresa AS porte,
+        lpad(CAST(emp.porte_empresa AS VARCHAR), 2, '0') AS porte,
         est.data_inicio_atividade,
-        est.situacao_cadastral,
+        lpad(CAST(est.situacao_cadastral AS VARCHAR), 2, '0') AS situacao_cadastral,
         est.uf,
-        {('mun.descricao AS municipio' if has_mun else "CAST(est.municipio AS VARCHAR) AS municipio")},
+        {('mun.descricao AS municipio' if has_mun else "lpad(CAST(est.municipio AS VARCHAR), 4, '0') AS municipio")},
         est.tipo_logradouro, est.logradouro, est.numero, est.complemento, est.bairro, est.cep,
-        (COALESCE(est.ddd_1,'')||COALESCE(est.telefone_1,'')) AS telefone1,
-        (COALESCE(est.ddd_2,'')||COALESCE(est.telefone_2,'')) AS telefone2,
+        est.telefone1, est.telefone2,
         est.correio_eletronico AS email,
-        est.cnae_fiscal_principal AS cnae_principal,
+        lpad(CAST(est.cnae_fiscal_principal AS VARCHAR), 7, '0') AS cnae_principal,
         {('cnae.descricao AS cnae_principal_nome' if has_cnae else "NULL AS cnae_principal_nome")},
         {tipo_expr} AS tipo_saude
       {from_where}
       ORDER BY emp.razao_social
     """
 
-    # Contagem
-    count_sql = f"SELECT COUNT(*) FROM ({select_sql}) t"
+    con = conectar(memory_limit=args.memory_limit)
+    views = {"estabelecimentos": scan(est_glob, COLS_EST), "empresas": scan(emp_glob, COLS_EMP)}
+    if has_sim: views["simples"] = scan(sim_glob, COLS_SIM)
+    criar_views(con, views)
+    if has_mun:  con.execute(f"CREATE TEMP TABLE municipios AS {scan(mun_glob, COLS_DESC)}")
+    if has_cnae: con.execute(f"CREATE TEMP TABLE cnaes AS {scan(cnae_glob, COLS_DESC)}")
 
-    con = duckdb.connect(database=":memory:")
-    total = con.execute(count_sql).fetchone()[0]
-    print(f"📦 Registros filtrados: {total:,}".replace(",", "."))
-
-    # Exporta CSV com BOM
-    tmp = out_csv + ".tmp"
-    tmp_duck = tmp.replace("\\","/")
-    copy_sql = f"COPY ({select_sql}) TO '{tmp_duck}' (HEADER, DELIMITER ';');"
+    # Exporta CSV com BOM: o BOM vai no nome da 1ª coluna, então com HEADER o DuckDB já
+    # grava o arquivo final começando por EF BB BF (sem .tmp e sem segunda cópia)
+    out_duck = out_csv.replace("\\","/")
+    copy_sql = f"COPY ({select_sql}) TO '{out_duck}' (HEADER, DELIMITER ';');"
 
+    # O COPY devolve o nº de linhas gravadas: a consulta roda uma vez só (sem COUNT(*) à parte)
     print("📝 Exportando CSV…")
-    con.execute(copy_sql)
-    with open(tmp, "rb") as src, open(out_csv, "wb") as dst:
-        dst.write(b"\xef\xbb\xbf")
-        shutil.copyfileobj(src, dst, length=1024*1024)
-    os.remove(tmp)
+    total = con.execute(copy_sql).fetchone()[0]
+    print(f"📦 Registros filtrados: {total:,}".replace(",", "."))
 
     con.close()
     dt = time.perf_counter()-t0
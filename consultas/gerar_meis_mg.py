@@ -2,36 +2,51 @@
 # gerar_meis_uberlandia_mg_csv.py
 # Uso:
 #   python gerar_meis_uberlandia_mg_csv.py --parquet-dir data/cnpj_parquet --out exports/meis_uberlandia_mg_ativas.csv
+#
+# Requer os .parquet gerados por scripts/cnpj_ingest_duckdb_v2.py (municipio e
+# situacao_cadastral já numéricos; cnpj/telefone1/telefone2/fax_completo pré-calculados).
 
 import argparse
 import os
-import duckdb
+from conexao import conectar, criar_views, scan
 
 DELIM = ";"  # separador
 
+# Colunas lidas de cada Parquet: cada view projeta só o que o SELECT/WHERE usam
+COLUNAS = {
+    "estabelecimentos": ["cnpj_basico", "cnpj", "nome_fantasia", "situacao_cadastral",
+                         "tipo_logradouro", "logradouro", "numero", "complemento", "bairro", "cep",
+                         "uf", "municipio", "telefone1", "telefone2", "fax_completo",
+                         "correio_eletronico"],
+    "empresas": ["cnpj_basico", "razao_social"],
+    "municipios": ["codigo", "descricao"],
+    "simples": ["cnpj_basico", "opcao_mei"],
+}
+ARQUIVOS = {"estabelecimentos": "Estabelecimentos", "empresas": "Empresas",
+            "municipios": "Municipios", "simples": "Simples"}
+
 BASE_FROM_WHERE = """
-FROM read_parquet('{base}/Estabelecimentos*.parquet') AS est
-JOIN read_parquet('{base}/Empresas*.parquet')         AS emp USING (cnpj_basico)
-JOIN read_parquet('{base}/Simples*.parquet')          AS sim USING (cnpj_basico)
-JOIN read_parquet('{base}/Municipios*.parquet')       AS mun
-  ON TRY_CAST(est.municipio AS INTEGER) = mun.codigo
+FROM estabelecimentos AS est
+JOIN empresas AS emp USING (cnpj_basico)
+JOIN municipios AS mun
+  ON est.municipio = mun.codigo
 WHERE
-  -- MEI
-  UPPER(COALESCE(sim.opcao_mei, 'N')) = 'S'
+  -- MEI (semi-join: nada do Simples vai pro SELECT, então o hash só guarda as chaves)
+  est.cnpj_basico IN (
+    SELECT cnpj_basico FROM simples
+    WHERE UPPER(COALESCE(opcao_mei, 'N')) = 'S'
+  )
   -- Minas Gerais
   AND UPPER(est.uf) = 'MG'
   -- Situação ativa
-  AND (
-    TRY_CAST(est.situacao_cadastral AS INTEGER) = 2
-    OR UPPER(est.situacao_cadastral) = 'ATIVA'
-  )
+  AND est.situacao_cadastral = 2
 """
 
 SQL_COPY = f"""
 COPY (
   SELECT
     -- identificação
-    (est.cnpj_basico || est.cnpj_ordem || est.cnpj_dv) AS cnpj,
+    est.cnpj,
     emp.razao_social,
     COALESCE(est.nome_fantasia, emp.razao_social)      AS nome_fantasia,
 
@@ -43,41 +58,38 @@ COPY (
     COALESCE(est.bairro,          '') AS bairro,
     COALESCE(est.cep,             '') AS cep,
     est.uf,
-    est.municipio                 AS municipio_codigo,
+    -- códigos são inteiros na ingestão; no CSV voltam com os zeros da RFB (0001, 02)
+    lpad(CAST(est.municipio AS VARCHAR), 4, '0') AS municipio_codigo,
     mun.descricao                 AS municipio_nome,
 
     -- contatos
-    (COALESCE(est.ddd_1, '') || COALESCE(est.telefone_1, '')) AS telefone1,
-    (COALESCE(est.ddd_2, '') || COALESCE(est.telefone_2, '')) AS telefone2,
-    (COALESCE(est.ddd_fax, '') || COALESCE(est.fax, ''))      AS fax,
+    est.telefone1,
+    est.telefone2,
+    est.fax_completo AS fax,
     COALESCE(est.correio_eletronico, '') AS email,
 
     -- status
-    est.situacao_cadastral
+    lpad(CAST(est.situacao_cadastral AS VARCHAR), 2, '0') AS situacao_cadastral
   {BASE_FROM_WHERE}
 ) TO '{{out}}' (HEADER, DELIMITER '{DELIM}');
 """
 
-SQL_COUNT = f"""
-SELECT COUNT(*) AS n
-{BASE_FROM_WHERE}
-"""
-
 def main():
     ap = argparse.ArgumentParser(description="Gera CSV (;) das MEIs ATIVAS de Uberlândia–MG com endereço, telefones e e-mail (join com Municipios).")
     ap.add_argument("--parquet-dir", required=True, help="Pasta dos .parquet (Empresas*, Estabelecimentos*, Simples*, Municipios*).")
     ap.add_argument("--out", default="exports/meis_uberlandia_mg_ativas.csv", help="Caminho do CSV de saída.")
+    ap.add_argument("--memory-limit", help="Limite de memória do DuckDB (ex.: 12GB). Padrão: o do DuckDB (80%% da RAM).")
     args = ap.parse_args()
 
     parquet_dir = os.path.abspath(args.parquet_dir).replace("\\", "/")
     out_csv = os.path.abspath(args.out)
     os.makedirs(os.path.dirname(out_csv), exist_ok=True)
 
-    con = duckdb.connect(database=":memory:")
-    # gera CSV
-    con.execute(SQL_COPY.format(base=parquet_dir, out=out_csv.replace("\\", "/")))
-    # conta linhas
-    total = con.execute(SQL_COUNT.format(base=parquet_dir)).fetchone()[0]
+    con = conectar(memory_limit=args.memory_limit)
+    criar_views(con, {nome: scan(f"{parquet_dir}/{arq}*.parquet", COLUNAS[nome])
+                      for nome, arq in ARQUIVOS.items()})
+    # gera CSV (o COPY devolve o nº de linhas gravadas; não precisa refazer o join p/ contar)
+    total = con.execute(SQL_COPY.format(out=out_csv.replace("\\", "/"))).fetchone()[0]
     con.close()
 
     print(f"✅ CSV gerado com separador ';': {out_csv}")
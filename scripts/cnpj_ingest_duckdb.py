@@ -3,19 +3,23 @@
 
 import os
 import re
+import json
 import sys
 import time
 import shutil
+import zlib
+import threading
 import zipfile
 import argparse
-import pandas as pd
-import pyarrow as pa
-import pyarrow.parquet as pq
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
 from pathlib import Path
 from urllib.parse import urljoin
 
 import duckdb
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 # ========== Configurações padrão ==========
 DEFAULT_BASE_URL = "https://arquivos.receitafederal.gov.br/dados/cnpj/dados_abertos_cnpj/2025-07/"
@@ -27,15 +31,37 @@ ZIP_PATTERN = re.compile(r'href="([^"]+\.zip)"', re.IGNORECASE)
 
 # Parâmetros de ingestão
 DUCKDB_THREADS = 4       # ou um número inteiro ex.: "8"
+# Pipeline: downloads em threads (I/O de rede) e conversões em processos (CPU).
+# Cada processo usa poucas threads no DuckDB para não disputar núcleos entre si.
+DOWNLOAD_WORKERS = 3
+CONVERT_WORKERS = max(1, (os.cpu_count() or 2) // 2)
+DUCKDB_THREADS_PER_WORKER = 2
+
+# Sessão HTTP única: reaproveita conexões TCP/TLS entre índice, HEADs e downloads
+# (pool grande o bastante p/ todos os downloads simultâneos) e refaz erros transitórios
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(pool_connections=8, pool_maxsize=32,
+                                      max_retries=Retry(total=5, backoff_factor=1.0,
+                                                        status_forcelist=(429, 500, 502, 503, 504))))
+SESSION.mount("http://", SESSION.adapters["https://"])
+
 CSV_DELIM = ";"               # conforme layout da Receita
 CSV_QUOTE = '"'               # aspas padrão
-CSV_HEADER = True             # arquivos possuem header
-ENCODING = "latin1"           # costuma ser latin1; troque para "utf8" se necessário
+CSV_HEADER = False            # arquivos da Receita não possuem header
+ENCODING = "latin-1"          # costuma ser latin-1; troque para "utf-8" se necessário
 
 # Parquet
-PARQUET_ROW_GROUP_SIZE = 128 * 1024 * 1024  # ~128MB
+PARQUET_ROW_GROUP_SIZE = 256_000           # linhas por row group (~8MB): filtros seletivos pulam o resto
 PARQUET_COMPRESSION = "ZSTD"                # "ZSTD" ou "SNAPPY"
+PARQUET_COMPRESSION_LEVEL = 3               # só vale para ZSTD
+# O writer Parquet do DuckDB já grava dicionário nas colunas de baixa cardinalidade
+# (uf, municipio, cnae, porte, situacao...), que encolhem 5-20x; não há o que ligar.
 PARQUET_PER_FILE = True                     # True = 1 parquet por CSV; False = shards múltiplos
+# Estabelecimentos sai ordenado por (uf, municipio, cnae_fiscal_principal): com os dados
+# agrupados, o min/max de cada row group deixa as consultas por UF/município pularem o resto.
+# Posições (1-based) no layout da Receita; municipio/cnae têm largura fixa, então a ordem
+# de texto coincide com a numérica.
+ESTABELECIMENTOS_ORDER_BY = "20, 21, 12"
 
 # ========== Funções utilitárias ==========
 
@@ -50,35 +76,112 @@ def human(nbytes: int) -> str:
             return f"{x:.1f} {u}"
         x /= 1024.0
 
-def list_zip_links(base_url: str):
-    """Lê a página de índice do mês e retorna a lista completa de URLs .zip"""
-    r = requests.get(base_url, timeout=60)
+def list_zip_links(base_url: str, cache_path: Path = None):
+    """
+    Lê a página de índice do mês e retorna a lista completa de URLs .zip.
+    Com cache_path, guarda ETag/Last-Modified + a lista; na próxima execução a
+    requisição é condicional e um 304 reaproveita a lista sem baixar/parsear o HTML.
+    """
+    cache = {}
+    if cache_path is not None and cache_path.exists():
+        try:
+            cache = json.loads(cache_path.read_text(encoding="utf-8"))
+        except ValueError:
+            cache = {}
+    if cache.get("base_url") != base_url:
+        cache = {}
+
+    headers = {}
+    if cache.get("etag"):
+        headers["If-None-Match"] = cache["etag"]
+    if cache.get("last_modified"):
+        headers["If-Modified-Since"] = cache["last_modified"]
+
+    r = SESSION.get(base_url, timeout=60, headers=headers)
+    if r.status_code == 304 and cache.get("zips"):
+        print("[INFO] Índice não mudou desde a última execução (304); usando lista em cache.")
+        return cache["zips"]
     r.raise_for_status()
     links = ZIP_PATTERN.findall(r.text)
     # remove duplicatas, ordena por nome
     zips = sorted(set(urljoin(base_url, href) for href in links))
     if not zips:
         raise RuntimeError("Nenhum .zip encontrado. Verifique o base_url.")
+
+    if cache_path is not None:
+        cache_path.write_text(json.dumps({
+            "base_url": base_url,
+            "etag": r.headers.get("ETag"),
+            "last_modified": r.headers.get("Last-Modified"),
+            "zips": zips,
+        }, indent=2), encoding="utf-8")
     return zips
 
-def download_file(url: str, dest: Path, chunk=1024*1024):
-    """Baixa um arquivo em chunks, com recomeço simples se já existir parcial."""
+def download_file(url: str, dest: Path, chunk=16*1024*1024, max_retries=3):
+    """
+    Baixa um arquivo com recomeço via Range se já existir parcial.
+    A cópia é feita por shutil.copyfileobj sobre o stream cru (sem loop de chunks em
+    Python) e o tamanho final é conferido com o Content-Length; se vier curto, retoma.
+    """
     ensure_dir(dest.parent)
     tmp = dest.with_suffix(dest.suffix + ".part")
-    mode = "ab" if tmp.exists() else "wb"
-    headers = {}
-    downloaded = tmp.stat().st_size if tmp.exists() else 0
-    if downloaded > 0:
-        headers["Range"] = f"bytes={downloaded}-"
-    with requests.get(url, stream=True, timeout=120, headers=headers) as r:
-        r.raise_for_status()
-        with open(tmp, mode) as f:
-            for chunk_data in r.iter_content(chunk_size=chunk):
-                if chunk_data:
-                    f.write(chunk_data)
+    for _ in range(max_retries):
+        downloaded = tmp.stat().st_size if tmp.exists() else 0
+        headers = {"Range": f"bytes={downloaded}-"} if downloaded > 0 else {}
+        with SESSION.get(url, stream=True, timeout=120, headers=headers) as r:
+            if r.status_code == 416:  # Range além do fim: o .part já está completo
+                break
+            r.raise_for_status()
+            if downloaded > 0 and r.status_code != 206:
+                downloaded = 0  # servidor ignorou o Range: recomeça do zero
+            expected = int(r.headers.get("Content-Length", 0))
+            encoded = bool(r.headers.get("Content-Encoding"))
+            with open(tmp, "ab" if downloaded > 0 else "wb") as f:
+                r.raw.decode_content = True
+                shutil.copyfileobj(r.raw, f, length=chunk)
+                total = f.tell()
+        if not expected or encoded or total == downloaded + expected:
+            break
+        print(f"[AVISO] Download incompleto de {dest.name} ({human(total)} de {human(downloaded + expected)}). Retomando...")
+    else:
+        raise RuntimeError(f"Download incompleto após {max_retries} tentativas: {url}")
     tmp.rename(dest)
     return dest
 
+def choose_member(z: zipfile.ZipFile) -> str:
+    """Escolhe o arquivo tabular dentro do zip da Receita."""
+    names = z.namelist()
+    if not names:
+        raise RuntimeError(f"Nenhum arquivo dentro de {z.filename}")
+
+    # 1) Prioriza arquivos que terminem com 'csv' ou '.csv' ou '.txt'
+    cand = [m for m in names if m.lower().endswith(("csv", ".csv", ".txt"))]
+
+    # 2) Se não achou, pega os que CONTÊM 'csv' no nome (caso MUNICCSV, EMPRECSV, ESTABELE etc.)
+    if not cand:
+        cand = [m for m in names if "csv" in m.lower()]
+
+    # 3) Como fallback absoluto (bem raro), pega o MAIOR arquivo do zip
+    if not cand:
+        cand = [max(names, key=lambda m: z.getinfo(m).file_size)]
+
+    # Usa o primeiro candidato
+    return cand[0]
+
+def member_crc_ok(z: zipfile.ZipFile, member: str) -> bool:
+    """Confere o CRC32 só do membro que será extraído (testzip() descompacta o zip inteiro)."""
+    crc = 0
+    try:
+        with z.open(member) as f:
+            while True:
+                block = f.read(16 * 1024 * 1024)
+                if not block:
+                    break
+                crc = zlib.crc32(block, crc)
+    except zipfile.BadZipFile:
+        return False
+    return (crc & 0xFFFFFFFF) == z.getinfo(member).CRC
+
 def unzip_single_csv(zip_path: Path, extract_dir: Path) -> Path:
     """
     Extrai exatamente UM arquivo tabular do zip da Receita e
@@ -88,23 +191,7 @@ def unzip_single_csv(zip_path: Path, extract_dir: Path) -> Path:
     ensure_dir(extract_dir)
 
     with zipfile.ZipFile(zip_path, 'r') as z:
-        names = z.namelist()
-        if not names:
-            raise RuntimeError(f"Nenhum arquivo dentro de {zip_path.name}")
-
-        # 1) Prioriza arquivos que terminem com 'csv' ou '.csv' ou '.txt'
-        cand = [m for m in names if m.lower().endswith(("csv", ".csv", ".txt"))]
-
-        # 2) Se não achou, pega os que CONTÊM 'csv' no nome (caso MUNICCSV, EMPRECSV, ESTABELE etc.)
-        if not cand:
-            cand = [m for m in names if "csv" in m.lower()]
-
-        # 3) Como fallback absoluto (bem raro), pega o MAIOR arquivo do zip
-        if not cand:
-            cand = [max(names, key=lambda m: z.getinfo(m).file_size)]
-
-        # Usa o primeiro candidato
-        member = cand[0]
+        member = choose_member(z)
 
         # Caminho alvo com extensão .csv garantida
         original_name = Path(member).name  # nome dentro do zip (sem subpastas)
@@ -113,145 +200,71 @@ def unzip_single_csv(zip_path: Path, extract_dir: Path) -> Path:
             base_name = base_name + ".csv"
         out_path = extract_dir / base_name
 
-        # Remove arquivo de saída se já existir
-        if out_path.exists():
-            out_path.unlink()
-
-        # Extrai para a pasta temporária
-        z.extract(member, path=extract_dir)
-
-        extracted = extract_dir / member  # pode vir com subpasta
-        final_src = extracted
-
-        # Se veio com subpastas, movemos para a raiz de extract_dir
-        if extracted != out_path:
-            # Garante pasta destino
-            ensure_dir(out_path.parent)
-            # Move/renomeia para o out_path com .csv
-            shutil.move(str(extracted), str(out_path))
-            final_src = out_path
-
-            # Tenta limpar subpastas vazias
-            try:
-                subdir = extract_dir / Path(member).parent
-                if subdir.exists():
-                    # remove diretórios vazios intermediários
-                    for p in sorted(subdir.glob("**/*"), reverse=True):
-                        if p.is_dir():
-                            try: p.rmdir()
-                            except: pass
-                    try: subdir.rmdir()
-                    except: pass
-            except Exception:
-                pass
-        else:
-            # O arquivo was extraído na raiz; se não tem .csv, renomeia
-            if final_src.suffix.lower() != ".csv":
-                final_csv = final_src.with_suffix(final_src.suffix + ".csv")
-                if final_csv.exists():
-                    final_csv.unlink()
-                final_src.rename(final_csv)
-                out_path = final_csv
+        # Extrai em streaming direto para o caminho final (já com .csv): uma única
+        # escrita em disco, sem z.extract + shutil.move e sem subpastas para limpar
+        with z.open(member) as src, open(out_path, "wb") as dst:
+            shutil.copyfileobj(src, dst, length=16 * 1024 * 1024)
 
     return out_path
 
-def ensure_utf8(src: Path) -> Path:
-    """
-    Garante um CSV em UTF-8. Se 'src' já estiver em UTF-8, retorna 'src'.
-    Caso contrário, cria um arquivo .utf8.csv ao lado e retorna o novo path.
-    A conversão é feita em streaming (linha a linha), sem estourar memória.
-    """
-    try:
-        # Teste rápido: tenta ler alguns KB como UTF-8
-        with open(src, "rb") as f:
-            chunk = f.read(1_000_000)  # 1MB de amostra
-        chunk.decode("utf-8")  # se falhar, vai pro except
-        return src  # já é UTF-8
-    except UnicodeDecodeError:
-        pass
-
-    dst = src.with_suffix(src.suffix + ".utf8.csv")
-    # Se já existe de tentativa anterior, reaproveita
-    if dst.exists() and dst.stat().st_size > 0:
-        return dst
-
-    # Transcodifica latin1 -> utf-8 em streaming
-    print(f"[INFO] Transcodificando para UTF-8: {src.name} -> {dst.name}")
-    with open(src, "r", encoding="latin1", newline="") as fin, \
-         open(dst, "w", encoding="utf-8", newline="") as fout:
-        # copia em blocos de linhas para ser eficiente
-        buf = fin.readlines(1024 * 1024)  # ~1MB por lote de linhas (ajuste se quiser)
-        while buf:
-            fout.writelines(buf)
-            buf = fin.readlines(1024 * 1024)
-    return dst
-
-def csv_to_parquet_with_duckdb(csv_path: Path, parquet_path: Path):
+def is_estabelecimentos(path: Path) -> bool:
+    return "estabele" in path.name.lower()  # ex.: K3241.K03200Y0.D50712.ESTABELE.csv
+
+def csv_to_parquet_with_duckdb(csv_path: Path, parquet_path: Path, threads: int = DUCKDB_THREADS):
     """
-    Lê CSV gigante (latin1, ; como separador) em chunks e grava Parquet via PyArrow.
-    Evita o parser do DuckDB e resolve de vez problemas de encoding/UTF-8.
+    Converte o CSV da Receita (latin1, ; como separador, sem header) direto para Parquet
+    com o leitor de CSV nativo do DuckDB: paralelo, sem pandas e sem transcodificar o
+    arquivo para UTF-8 antes. Tudo como VARCHAR (colunas column0, column1, ...).
     """
     ensure_dir(parquet_path.parent)
+    order_by = f"ORDER BY {ESTABELECIMENTOS_ORDER_BY}" if is_estabelecimentos(csv_path) else ""
+    level = f", COMPRESSION_LEVEL {PARQUET_COMPRESSION_LEVEL}" if PARQUET_COMPRESSION == "ZSTD" else ""
+    src = str(csv_path).replace("\\", "/")
+    dst = str(parquet_path).replace("\\", "/")
 
-    # Configurações
-    chunksize = 200_000          # ajuste se quiser menos/memória
-    sep = CSV_DELIM or ";"       # conforme especificação da Receita
-    encoding = "latin1"          # RF usa latin1 nos dumps
-    first = True
-    writer = None
-
+    con = duckdb.connect(database=":memory:")
     try:
-        for chunk in pd.read_csv(
-            csv_path,
-            sep=sep,
-            encoding=encoding,
-            dtype=str,                 # tudo como texto (seguro p/ qualidade dos dados)
-            chunksize=chunksize,
-            engine="python",           # engine robusta p/ CSV “difícil”
-            on_bad_lines="warn"        # se encontrar linha inválida, pula e avisa
-        ):
-            # Normaliza nomes de colunas (se houver header) — muitos arquivos não têm;
-            # pandas pode criar nomes 0..N-1 automaticamente. Mantemos assim.
-            table = pa.Table.from_pandas(chunk, preserve_index=False)
-            if first:
-                writer = pq.ParquetWriter(
-                    where=str(parquet_path),
-                    schema=table.schema,
-                    compression=PARQUET_COMPRESSION.lower(),  # 'zstd' ou 'snappy'
-                    use_dictionary=False                       # menos CPU/memória
-                )
-                first = False
-            writer.write_table(table)
+        con.execute(f"PRAGMA threads={threads}")
+        con.execute("PRAGMA preserve_insertion_order=false")
+        con.execute(f"""
+            COPY (
+              SELECT *
+              FROM read_csv('{src}',
+                            delim='{CSV_DELIM}', quote='{CSV_QUOTE}', header={str(CSV_HEADER).lower()},
+                            all_varchar=true, encoding='{ENCODING}', parallel=true)
+              {order_by}
+            ) TO '{dst}' (FORMAT PARQUET, COMPRESSION {PARQUET_COMPRESSION}{level},
+                          ROW_GROUP_SIZE {PARQUET_ROW_GROUP_SIZE})
+        """)
     finally:
-        if writer is not None:
-            writer.close()
+        con.close()
 
-def process_one_zip(zip_url: str, work_dir: Path, out_dir: Path, keep_zip: bool, keep_csv: bool):
-    """Baixa 1 zip (se não existir), extrai CSV, converte para Parquet e limpa temporários conforme flags."""
+def paths_for_zip(zip_url: str, work_dir: Path, out_dir: Path):
     zip_name = zip_url.rstrip("/").split("/")[-1]
     stem = Path(zip_name).stem  # sem .zip
+    return work_dir / "zips" / zip_name, out_dir / f"{stem}.parquet"
 
-    zip_path = work_dir / "zips" / zip_name
-    csv_dir = work_dir / "csv_tmp"
-    parquet_path = out_dir / f"{stem}.parquet"
+def fetch_zip(zip_url: str, work_dir: Path, out_dir: Path):
+    """Baixa 1 zip (se não existir ou estiver corrompido). Retorna None se o Parquet já existe."""
+    zip_path, parquet_path = paths_for_zip(zip_url, work_dir, out_dir)
 
     if parquet_path.exists():
-        print(f"[SKIP] Já existe Parquet para {zip_name}: {parquet_path.name}")
-        return
+        print(f"[SKIP] Já existe Parquet para {zip_path.name}: {parquet_path.name}")
+        return None
 
-    # 1) download (somente se não existir)
     if zip_path.exists():
         print(f"[PULANDO DOWNLOAD] {zip_path.name} já existe ({human(zip_path.stat().st_size)}).")
         # Valida o ZIP existente; se estiver corrompido, rebaixa
         try:
             with zipfile.ZipFile(zip_path, 'r') as z:
-                bad = z.testzip()
-                if bad is not None:
-                    print(f"[AVISO] ZIP existente está corrompido (arquivo com problema: {bad}). Rebaixando...")
-                    zip_path.unlink(missing_ok=True)
-                    print(f"[BAIXANDO] {zip_url}")
-                    download_file(zip_url, zip_path)
-                    print(f"  -> {zip_path.name} ({human(zip_path.stat().st_size)})")
+                member = choose_member(z)
+                bad = None if member_crc_ok(z, member) else member
+            if bad is not None:
+                print(f"[AVISO] ZIP existente está corrompido (arquivo com problema: {bad}). Rebaixando...")
+                zip_path.unlink(missing_ok=True)
+                print(f"[BAIXANDO] {zip_url}")
+                download_file(zip_url, zip_path)
+                print(f"  -> {zip_path.name} ({human(zip_path.stat().st_size)})")
         except zipfile.BadZipFile:
             print(f"[AVISO] ZIP existente é inválido. Rebaixando...")
             zip_path.unlink(missing_ok=True)
@@ -262,6 +275,61 @@ def process_one_zip(zip_url: str, work_dir: Path, out_dir: Path, keep_zip: bool,
         print(f"[BAIXANDO] {zip_url}")
         download_file(zip_url, zip_path)
         print(f"  -> {zip_path.name} ({human(zip_path.stat().st_size)})")
+    return zip_path
+
+def stream_member_to_fifo(zip_path: Path, fifo: Path):
+    """Descompacta o CSV do zip direto no FIFO (roda numa thread enquanto o DuckDB lê a outra ponta)."""
+    try:
+        with zipfile.ZipFile(zip_path, 'r') as z, z.open(choose_member(z)) as src, open(fifo, "wb") as dst:
+            shutil.copyfileobj(src, dst, length=16 * 1024 * 1024)
+    except BrokenPipeError:
+        pass  # o leitor desistiu (erro na conversão); o erro real aparece lá
+
+def convert_zip_via_fifo(zip_path: Path, parquet_path: Path, csv_dir: Path, threads: int):
+    """
+    Converte sem gravar o CSV em disco: uma thread descompacta o membro num FIFO e o
+    read_csv do DuckDB consome a outra ponta, sobrepondo zlib e encoding do Parquet.
+    """
+    with zipfile.ZipFile(zip_path, 'r') as z:
+        member = choose_member(z)
+    fifo = csv_dir / (Path(member).name + ".csv.pipe")  # mantém o nome (ex.: ...ESTABELE) p/ is_estabelecimentos
+    if fifo.exists():
+        fifo.unlink()
+    os.mkfifo(fifo)
+    writer = threading.Thread(target=stream_member_to_fifo, args=(zip_path, fifo), daemon=True)
+    writer.start()
+    try:
+        print(f"[CONVERTENDO] {zip_path.name} (streaming, sem CSV em disco) -> {parquet_path.name}")
+        csv_to_parquet_with_duckdb(fifo, parquet_path, threads)
+    finally:
+        # Se o DuckDB falhou antes de ler tudo, abre/fecha a ponta de leitura até a
+        # thread escritora sair (destrava o open() e faz o write() falhar com EPIPE)
+        while writer.is_alive():
+            fd = os.open(fifo, os.O_RDONLY | os.O_NONBLOCK)
+            writer.join(0.1)
+            os.close(fd)
+        fifo.unlink(missing_ok=True)
+
+def unzipped_size(zip_path: Path) -> int:
+    with zipfile.ZipFile(zip_path, 'r') as z:
+        return sum(i.file_size for i in z.infolist())
+
+def uses_fifo(keep_csv: bool) -> bool:
+    return not keep_csv and hasattr(os, "mkfifo")
+
+def convert_zip(zip_path: Path, parquet_path: Path, work_dir: Path, keep_zip: bool, keep_csv: bool,
+                threads: int = DUCKDB_THREADS):
+    """Extrai o CSV do zip, converte para Parquet e limpa temporários conforme flags."""
+    csv_dir = work_dir / "csv_tmp"
+
+    # Sem --keep-csv e com FIFO disponível (Linux/macOS), o CSV nunca é gravado em disco
+    if uses_fifo(keep_csv):
+        t0 = time.time()
+        convert_zip_via_fifo(zip_path, parquet_path, csv_dir, threads)
+        print(f"  -> OK em {time.time() - t0:.1f}s | {human(parquet_path.stat().st_size)}")
+        if not keep_zip and zip_path.exists():
+            zip_path.unlink()
+        return
 
     # 2) unzip  (1 CSV por zip)
     print(f"[EXTRAINDO] {zip_path.name}")
@@ -271,7 +339,7 @@ def process_one_zip(zip_url: str, work_dir: Path, out_dir: Path, keep_zip: bool,
     # 3) csv -> parquet (DuckDB)
     print(f"[CONVERTENDO] {csv_path.name} -> {parquet_path.name}")
     t0 = time.time()
-    csv_to_parquet_with_duckdb(csv_path, parquet_path)
+    csv_to_parquet_with_duckdb(csv_path, parquet_path, threads)
     print(f"  -> OK em {time.time() - t0:.1f}s | {human(parquet_path.stat().st_size)}")
 
     # 4) limpeza
@@ -280,6 +348,88 @@ def process_one_zip(zip_url: str, work_dir: Path, out_dir: Path, keep_zip: bool,
     if not keep_zip and zip_path.exists():
         zip_path.unlink()
 
+def process_one_zip(zip_url: str, work_dir: Path, out_dir: Path, keep_zip: bool, keep_csv: bool):
+    """Baixa 1 zip (se não existir), extrai CSV, converte para Parquet e limpa temporários conforme flags."""
+    zip_path = fetch_zip(zip_url, work_dir, out_dir)
+    if zip_path is None:
+        return
+    _, parquet_path = paths_for_zip(zip_url, work_dir, out_dir)
+    convert_zip(zip_path, parquet_path, work_dir, keep_zip, keep_csv)
+
+def process_zips_parallel(zips, work_dir: Path, out_dir: Path, keep_zip: bool, keep_csv: bool,
+                          download_workers: int, convert_workers: int):
+    """
+    Produtor/consumidor: as threads baixam os zips e cada zip pronto é entregue ao pool
+    de processos para extração/conversão, enquanto os próximos ainda baixam.
+
+    No máximo download_workers + convert_workers zips ficam em disco (baixando ou
+    esperando conversão), então os downloads não se acumulam à frente. Quando o CSV é
+    extraído em disco (--keep-csv ou sem FIFO), o processo pai só começa uma conversão se
+    o CSV descompactado cabe no espaço livre menos o já reservado pelas conversões em
+    andamento (senão espera uma terminar).
+    """
+    csv_dir = work_dir / "csv_tmp"
+    ensure_dir(csv_dir)
+    max_in_flight = download_workers + convert_workers
+    pending = iter(zips)
+    downloading = {}   # future -> zip_url
+    ready = deque()    # (zip_url, zip_path, bytes do CSV) esperando conversão
+    converting = {}    # future -> (zip_url, bytes reservados)
+    reserved = 0
+
+    with ThreadPoolExecutor(max_workers=download_workers) as downloads, \
+         ProcessPoolExecutor(max_workers=convert_workers) as conversions:
+        while True:
+            # novos downloads só enquanto há vaga na fila baixando/esperando/convertendo
+            while len(downloading) + len(ready) + len(converting) < max_in_flight:
+                zip_url = next(pending, None)
+                if zip_url is None:
+                    break
+                downloading[downloads.submit(fetch_zip, zip_url, work_dir, out_dir)] = zip_url
+
+            # conversões: reserva o tamanho do CSV antes de submeter
+            while ready and len(converting) < convert_workers:
+                zip_url, zip_path, needed = ready[0]
+                free = shutil.disk_usage(csv_dir).free - reserved
+                if needed > free:
+                    if converting:
+                        break  # espera uma conversão terminar e liberar espaço
+                    ready.popleft()
+                    print(f"[ERRO] Espaço insuficiente p/ extrair {zip_path.name}: "
+                          f"precisa {human(needed)}, livre {human(free)}")
+                    continue
+                ready.popleft()
+                reserved += needed
+                _, parquet_path = paths_for_zip(zip_url, work_dir, out_dir)
+                job = conversions.submit(convert_zip, zip_path, parquet_path, work_dir,
+                                         keep_zip, keep_csv, DUCKDB_THREADS_PER_WORKER)
+                converting[job] = (zip_url, needed)
+
+            if not downloading and not converting:
+                if not ready:
+                    break
+                continue  # o que sobrou em ready é tratado na volta (sem conversões rodando)
+
+            done, _ = wait(list(downloading) + list(converting), return_when=FIRST_COMPLETED)
+            for fut in done:
+                if fut in downloading:
+                    zip_url = downloading.pop(fut)
+                    try:
+                        zip_path = fut.result()
+                        if zip_path is not None:
+                            # via FIFO o CSV nunca vai para o disco: nada a reservar
+                            needed = 0 if uses_fifo(keep_csv) else unzipped_size(zip_path)
+                            ready.append((zip_url, zip_path, needed))
+                    except Exception as e:
+                        print(f"[ERRO] Falha ao baixar {zip_url}: {e}")
+                else:
+                    zip_url, needed = converting.pop(fut)
+                    reserved -= needed
+                    try:
+                        fut.result()
+                    except Exception as e:
+                        print(f"[ERRO] Falha ao processar {zip_url}: {e}")
+
 
 def main():
     parser = argparse.ArgumentParser(
@@ -299,6 +449,10 @@ def main():
                         help="Processa apenas zips cujo nome contenha este trecho (regex simples).")
     parser.add_argument("--limit", type=int, default=0,
                         help="Processa no máximo N arquivos.")
+    parser.add_argument("--workers", type=int, default=CONVERT_WORKERS,
+                        help=f"Processos de conversão em paralelo (padrão: {CONVERT_WORKERS}; 1 = sequencial).")
+    parser.add_argument("--download-workers", type=int, default=DOWNLOAD_WORKERS,
+                        help=f"Downloads simultâneos quando --workers > 1 (padrão: {DOWNLOAD_WORKERS}).")
     args = parser.parse_args()
 
     work_dir = Path(args.work_dir).resolve()
@@ -312,7 +466,7 @@ def main():
     print(f"[INFO] Out  dir: {out_dir}")
 
     # Lista todos os .zip do mês
-    zips = list_zip_links(args.base_url)
+    zips = list_zip_links(args.base_url, work_dir / "zips_index.json")
 
     # Filtro opcional (ex.: 'Estabelecimentos', 'Empresas', 'Socios', 'Simples')
     if args.filter:
@@ -326,6 +480,13 @@ def main():
         zips = zips[:args.limit]
 
     print(f"[INFO] {len(zips)} arquivos para processar.")
+    if args.workers > 1:
+        print(f"[INFO] Paralelo: {args.download_workers} downloads, {args.workers} conversões.")
+        process_zips_parallel(zips, work_dir, out_dir, args.keep_zip, args.keep_csv,
+                              args.download_workers, args.workers)
+        print("\n[OK] Finalizado.")
+        return
+
     for i, zip_url in enumerate(zips, start=1):
         print(f"\n=== ({i}/{len(zips)}) ===")
         try:
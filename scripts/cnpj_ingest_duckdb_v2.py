@@ -5,7 +5,7 @@
 Ingestão CNPJ → Parquet com nomes de colunas corretos na origem.
 - Baixa os .zip do mês da Receita, extrai 1 CSV por zip, converte em Parquet.
 - Garante nomes de colunas corretos por tipo de base (Empresas, Estabelecimentos, etc).
-- Lê em chunks (dtype=str), escreve Parquet ZSTD, com logs claros.
+- Converte com o leitor de CSV paralelo do DuckDB (COPY ... TO parquet), ZSTD, com logs claros.
 
 Uso típico:
   python cnpj_ingest_duckdb.py --base-url https://.../2025-07/ --out-dir ./parquet
@@ -15,18 +15,24 @@ Uso típico:
 
 import os
 import re
+import csv
 import sys
+import json
 import time
 import shutil
+import threading
 import zipfile
 import argparse
+import functools
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
 from pathlib import Path
 from urllib.parse import urljoin
 
+import duckdb
 import requests
-import pandas as pd
-import pyarrow as pa
-import pyarrow.parquet as pq
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 # ===================== Configurações padrão =====================
 
@@ -35,15 +41,41 @@ ZIP_PATTERN = re.compile(r'href="([^"]+\.zip)"', re.IGNORECASE)
 
 CSV_DELIM = ";"         # Receita
 CSV_QUOTE = '"'         # aspas padrão
-ENCODING_READ = "latin1"  # dumps costumam vir em latin1
-CHUNKSIZE = 200_000
+ENCODING_READ = "latin-1"  # dumps costumam vir em latin1 (nome aceito pelo Python e pelo DuckDB)
+DUCKDB_THREADS = os.cpu_count() or 1
+
+# Pipeline paralelo: downloads em threads (rede) e conversões em processos (CPU)
+DOWNLOAD_WORKERS = 4
+CONVERT_WORKERS = max(1, (os.cpu_count() or 2) // 2)
+DUCKDB_THREADS_PER_WORKER = 2
+
+# Download em faixas (HTTP Range) paralelas: 1 conexão TCP raramente enche o link
+RANGE_PARTS = 6
+RANGE_MIN_SIZE = 64 * 1024 * 1024  # abaixo disso não compensa dividir
+
+# Sessão HTTP única: reaproveita conexões TCP/TLS entre índice, HEADs e downloads
+# (pool grande o bastante p/ todos os downloads simultâneos) e refaz erros transitórios
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(pool_connections=8, pool_maxsize=32,
+                                      max_retries=Retry(total=5, backoff_factor=1.0,
+                                                        status_forcelist=(429, 500, 502, 503, 504))))
+SESSION.mount("http://", SESSION.adapters["https://"])
 
 PARQUET_COMPRESSION = "ZSTD"
-USE_DICTIONARY = False  # menos CPU/memória
+PARQUET_COMPRESSION_LEVEL = 1  # a conversão é limitada por CPU: o 1 gasta bem menos que o 3 p/ ~2% a mais de tamanho
+# Row groups pequenos (~8MB): filtros seletivos (UF/município) descartam quase tudo pelo min/max
+ROW_GROUP_SIZE = 256_000
 PARQUET_PER_FILE = True
+# Linhas malformadas toleradas por arquivo antes de abortar a conversão (0 = nenhuma).
+# As rejeitadas vão para <arquivo>.rejects.csv ao lado do Parquet
+MAX_REJECTS = 0
+# Estabelecimentos sai ordenado por (uf, municipio, cnae_fiscal_principal): com os dados
+# agrupados, o min/max de cada row group deixa os filtros das consultas por UF/município/CNAE
+# pularem o resto. São os nomes já tipados do SELECT (municipio e cnae ordenam como número)
+ESTABELECIMENTOS_ORDER_BY = ("uf", "municipio", "cnae_fiscal_principal")
 
 # ===================== Dicionários de colunas (oficiais do projeto) =====================
-# Tudo como texto/VARCHAR. Ajustado a partir das definições salvas no projeto.
+# Tudo como texto/VARCHAR (exceto NUMERIC_COLS). Ajustado a partir das definições salvas no projeto.
 
 COLS = {
     # --- Tabelas principais do projeto ---
@@ -101,6 +133,12 @@ DETECT_MAP = [
     ("paises", ("paises", "países", "pais")),
     ("qualificacoes", ("qualificacoes", "qualificações", "qualif", "qualscsv")),
 ]
+# Tudo numa regex só: as alternativas são tentadas na ordem do DETECT_MAP (a 1ª base
+# cuja palavra-chave aparece no nome vence), com 1 grupo nomeado por base.
+BASE_RE = re.compile(
+    "^(?:" + "|".join(f".*(?P<{base}>{'|'.join(map(re.escape, keys))})" for base, keys in DETECT_MAP) + ")",
+    re.IGNORECASE | re.DOTALL,
+)
 
 
 # ===================== Utilitários =====================
@@ -117,7 +155,7 @@ def human(nbytes: int) -> str:
         x /= 1024.0
 
 def list_zip_links(base_url: str):
-    r = requests.get(base_url, timeout=60)
+    r = SESSION.get(base_url, timeout=60)
     r.raise_for_status()
     links = ZIP_PATTERN.findall(r.text)
     zips = sorted(set(urljoin(base_url, href) for href in links))
@@ -125,7 +163,8 @@ def list_zip_links(base_url: str):
         raise RuntimeError("Nenhum .zip encontrado. Verifique o base_url.")
     return zips
 
-def download_file(url: str, dest: Path, chunk=1024*1024):
+def download_single(url: str, dest: Path, chunk=1024*1024):
+    """Download em 1 stream, com recomeço via Range se já existir parcial."""
     ensure_dir(dest.parent)
     tmp = dest.with_suffix(dest.suffix + ".part")
     mode = "ab" if tmp.exists() else "wb"
@@ -133,7 +172,7 @@ def download_file(url: str, dest: Path, chunk=1024*1024):
     downloaded = tmp.stat().st_size if tmp.exists() else 0
     if downloaded > 0:
         headers["Range"] = f"bytes={downloaded}-"
-    with requests.get(url, stream=True, timeout=120, headers=headers) as r:
+    with SESSION.get(url, stream=True, timeout=120, headers=headers) as r:
         r.raise_for_status()
         with open(tmp, mode) as f:
             for chunk_data in r.iter_content(chunk_size=chunk):
@@ -142,6 +181,88 @@ def download_file(url: str, dest: Path, chunk=1024*1024):
     tmp.rename(dest)
     return dest
 
+class RangeNotSupported(Exception):
+    pass
+
+def _fetch_range(url: str, tmp: Path, part: dict, lock: threading.Lock, save, chunk: int):
+    """Baixa bytes [pos, end] de uma faixa e grava no offset certo do .part (pos avança a cada bloco)."""
+    if part["pos"] > part["end"]:
+        return
+    headers = {"Range": f"bytes={part['pos']}-{part['end']}"}
+    with SESSION.get(url, stream=True, timeout=120, headers=headers) as r:
+        r.raise_for_status()
+        if r.status_code != 206:
+            raise RangeNotSupported(url)
+        # sem buffer: o que o .part.json diz que foi gravado já está no arquivo
+        with open(tmp, "r+b", buffering=0) as f:
+            f.seek(part["pos"])
+            for i, data in enumerate(r.iter_content(chunk_size=chunk), start=1):
+                f.write(data)
+                with lock:
+                    part["pos"] += len(data)
+                if i % 64 == 0:
+                    save()
+    if part["pos"] <= part["end"]:
+        raise RuntimeError(f"Faixa incompleta ({part['pos']}..{part['end']}) em {url}")
+
+def download_file(url: str, dest: Path, parts: int = RANGE_PARTS, chunk=1024*1024):
+    """
+    Baixa em `parts` faixas HTTP Range simultâneas, gravando cada uma no seu offset de
+    um .part pré-alocado. O progresso de cada faixa fica em .part.json, então uma execução
+    interrompida retoma de onde parou. Sem Range/Content-Length (ou arquivo pequeno),
+    cai no download de 1 stream.
+    """
+    ensure_dir(dest.parent)
+    tmp = dest.with_suffix(dest.suffix + ".part")
+    state_path = dest.with_suffix(dest.suffix + ".part.json")
+
+    h = SESSION.head(url, timeout=60, allow_redirects=True)
+    size = int(h.headers.get("Content-Length", 0)) if h.ok else 0
+    ranged = h.ok and h.headers.get("Accept-Ranges", "").lower() == "bytes"
+    if parts <= 1 or not ranged or size < RANGE_MIN_SIZE:
+        if state_path.exists():  # sobra de um download em faixas: .part não é contíguo
+            state_path.unlink()
+            tmp.unlink(missing_ok=True)
+        return download_single(url, dest, chunk)
+
+    state = None
+    if state_path.exists() and tmp.exists():
+        try:
+            state = json.loads(state_path.read_text())
+        except ValueError:
+            state = None
+    if not state or state.get("size") != size or tmp.stat().st_size != size:
+        step = -(-size // parts)
+        state = {"size": size, "parts": [{"pos": i, "end": min(i + step, size) - 1}
+                                          for i in range(0, size, step)]}
+        with open(tmp, "wb") as f:
+            f.truncate(size)  # pré-aloca (esparso); cada faixa escreve no seu offset
+
+    lock = threading.Lock()
+    def save():
+        # grava o progresso (o que já foi escrito no .part) p/ retomar se o processo cair
+        with lock:
+            state_path.write_text(json.dumps(state))
+
+    save()
+    try:
+        with ThreadPoolExecutor(max_workers=len(state["parts"])) as pool:
+            futs = [pool.submit(_fetch_range, url, tmp, part, lock, save, chunk) for part in state["parts"]]
+            for fut in futs:
+                fut.result()
+    except RangeNotSupported:
+        print(f"[AVISO] Servidor ignorou Range em {dest.name}; baixando em 1 stream.")
+        state_path.unlink(missing_ok=True)
+        tmp.unlink(missing_ok=True)
+        return download_single(url, dest, chunk)
+    except BaseException:
+        save()
+        raise
+
+    state_path.unlink(missing_ok=True)
+    tmp.rename(dest)
+    return dest
+
 def unzip_single_csv(zip_path: Path, extract_dir: Path) -> Path:
     ensure_dir(extract_dir)
     with zipfile.ZipFile(zip_path, 'r') as z:
@@ -157,40 +278,15 @@ def unzip_single_csv(zip_path: Path, extract_dir: Path) -> Path:
         original_name = Path(member).name
         base_name = original_name if original_name.lower().endswith(".csv") else original_name + ".csv"
         out_path = extract_dir / base_name
-        if out_path.exists():
-            out_path.unlink()
-        z.extract(member, path=extract_dir)
-        extracted = extract_dir / member
-        if extracted != out_path:
-            ensure_dir(out_path.parent)
-            shutil.move(str(extracted), str(out_path))
-            # tenta limpar subpastas vazias
-            try:
-                subdir = extract_dir / Path(member).parent
-                if subdir.exists():
-                    for p in sorted(subdir.glob("**/*"), reverse=True):
-                        if p.is_dir():
-                            try: p.rmdir()
-                            except: pass
-                    try: subdir.rmdir()
-                    except: pass
-            except Exception:
-                pass
-        else:
-            if out_path.suffix.lower() != ".csv":
-                final_csv = out_path.with_suffix(out_path.suffix + ".csv")
-                if final_csv.exists():
-                    final_csv.unlink()
-                out_path.rename(final_csv)
-                out_path = final_csv
+        # Stream direto p/ o caminho final: uma escrita só, sem z.extract + shutil.move
+        # e sem subpastas do zip p/ limpar depois
+        with z.open(member) as src, open(out_path, "wb") as dst:
+            shutil.copyfileobj(src, dst, length=4 * 1024 * 1024)
     return out_path
 
 def detect_base_from_filename(path: Path) -> str:
-    n = path.name.lower()
-    for base, keys in DETECT_MAP:
-        if any(k in n for k in keys):
-            return base
-    return ""
+    m = BASE_RE.match(path.name)
+    return m.lastgroup if m else ""
 
 
 # --------------------- Heurística de header e nomes ---------------------
@@ -203,11 +299,13 @@ def looks_like_header(line: str) -> bool:
     # Tem letras? (rótulos) e separadores plausíveis?
     return (CSV_DELIM in line) and bool(re.search(r"[A-Za-zÀ-ÿ_]", line))
 
-def choose_column_names(csv_path: Path, base: str, ncols_detected: int, header_present: bool):
+@functools.lru_cache(maxsize=None)
+def choose_column_names(base: str, ncols_detected: int, header_present: bool):
     """
-    Decide o vetor final de nomes a aplicar no DataFrame:
+    Decide o vetor final de nomes a aplicar nas colunas do CSV
+    (só depende de base/nº de colunas/header: as partes 0..9 de uma base reusam o resultado):
       - Se 'base' reconhecida e o número de colunas bate, usa COLS[base]
-      - Caso contrário, se header presente, deixa pandas usar header
+      - Caso contrário, se header presente, usa o header do arquivo
       - Caso contrário, gera nomes auto col_00..col_NN
     """
     target = COLS.get(base)
@@ -219,76 +317,119 @@ def choose_column_names(csv_path: Path, base: str, ncols_detected: int, header_p
     auto = [f"col_{i:02d}" for i in range(ncols_detected)]
     return auto, f"[WARN] Cabeçalho ausente/inesperado ({ncols_detected} col.) — usando nomes automáticos"
 
+# --------------------- Colunas numéricas e derivadas ---------------------
+
+# Códigos de baixa cardinalidade gravados como inteiro:
+# filtros viram igualdade direta, sem TRY_CAST, e usam as estatísticas do Parquet.
+NUMERIC_COLS = {
+    "cnaes": {"codigo": "INTEGER"},
+    "empresas": {"porte_empresa": "TINYINT"},
+    "estabelecimentos": {"identificador_matriz_filial": "TINYINT", "situacao_cadastral": "TINYINT",
+                         "cnae_fiscal_principal": "INTEGER", "municipio": "SMALLINT"},
+    "municipios": {"codigo": "SMALLINT"},
+}
+
+def _q(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+def select_list(names, base: str) -> str:
+    """
+    Colunas do SELECT do COPY: as do CSV (com NUMERIC_COLS convertidas; o que não for
+    número vira NULL) e, em Estabelecimentos, as colunas derivadas que as consultas
+    recalculavam a cada linha:
+      - cnpj_full: CNPJ completo (básico+ordem+DV) como BIGINT
+      - cnpj: o mesmo CNPJ como texto de 14 dígitos
+      - telefone1/telefone2/fax_completo: DDD + número ('' se ausentes)
+    """
+    numeric = NUMERIC_COLS.get(base, {})
+    cols = [f"TRY_CAST({_q(n)} AS {numeric[n]}) AS {_q(n)}" if n in numeric else _q(n) for n in names]
+    if base == "estabelecimentos":
+        present = set(names)
+        if {"cnpj_basico", "cnpj_ordem", "cnpj_dv"}.issubset(present):
+            cnpj = "(cnpj_basico || cnpj_ordem || cnpj_dv)"
+            cols += [f"TRY_CAST({cnpj} AS BIGINT) AS cnpj_full", f"{cnpj} AS cnpj"]
+        for dst, ddd, num in (("telefone1", "ddd_1", "telefone_1"),
+                              ("telefone2", "ddd_2", "telefone_2"),
+                              ("fax_completo", "ddd_fax", "fax")):
+            if {ddd, num}.issubset(present):
+                cols.append(f"COALESCE({ddd}, '') || COALESCE({num}, '') AS {dst}")
+    return ",\n                   ".join(cols)
+
 # --------------------- Conversão CSV → Parquet ---------------------
 
-def csv_to_parquet(csv_path: Path, parquet_path: Path):
+def csv_to_parquet(csv_path: Path, parquet_path: Path, threads: int = DUCKDB_THREADS,
+                   max_rejects: int = MAX_REJECTS):
     ensure_dir(parquet_path.parent)
 
     base = detect_base_from_filename(csv_path)
-    first = True
-    writer = None
 
-    # espiar a primeira linha p/ heurística de header
+    # espiar a primeira linha p/ heurística de header e nº de colunas
     first_line = _first_line(csv_path)
     header_present = looks_like_header(first_line)
-
-    # Lê um pequeno pedaço para descobrir quantas colunas existem
-    sample = pd.read_csv(
-        csv_path, sep=CSV_DELIM, encoding=ENCODING_READ,
-        dtype=str, nrows=5, header=0 if header_present else None,
-        engine="python", on_bad_lines="warn", quotechar=CSV_QUOTE
-    )
-    ncols = sample.shape[1]
-    decided_names, msg = choose_column_names(csv_path, base, ncols, header_present)
+    header = next(csv.reader([first_line.rstrip("\r\n")], delimiter=CSV_DELIM, quotechar=CSV_QUOTE))
+    decided_names, msg = choose_column_names(base, len(header), header_present)
     print(f"    [HEADER] base='{base or 'desconhecida'}' → {msg}")
 
-    # Leitura definitiva em chunks
-    read_kwargs = dict(
-        sep=CSV_DELIM,
-        encoding=ENCODING_READ,
-        dtype=str,
-        chunksize=CHUNKSIZE,
-        engine="python",
-        on_bad_lines="warn",
-        quotechar=CSV_QUOTE
-    )
-    if decided_names is None and header_present:
+    if decided_names is None:
         # usar header do arquivo
-        read_kwargs["header"] = 0
+        names, skip_header = header, True
     else:
-        # sem header: força nomes decididos
-        read_kwargs["header"] = None
-        read_kwargs["names"] = decided_names
+        # força nomes decididos (a 1ª linha é lida como dado, como antes)
+        names, skip_header = decided_names, False
+
+    order_by = ""
+    if base == "estabelecimentos" and all(c in names for c in ESTABELECIMENTOS_ORDER_BY):
+        order_by = "ORDER BY " + ", ".join(ESTABELECIMENTOS_ORDER_BY)
 
-    # Converter
+    columns = "{" + ", ".join(f"'{n.replace(chr(39), chr(39) * 2)}': 'VARCHAR'" for n in names) + "}"
+    src = str(csv_path).replace("\\", "/")
+    dst = str(parquet_path).replace("\\", "/")
+
+    con = duckdb.connect(database=":memory:")
     try:
-        for chunk in pd.read_csv(csv_path, **read_kwargs):
-            table = pa.Table.from_pandas(chunk, preserve_index=False)
-            if first:
-                writer = pq.ParquetWriter(
-                    where=str(parquet_path),
-                    schema=table.schema,
-                    compression=PARQUET_COMPRESSION.lower(),
-                    use_dictionary=USE_DICTIONARY,
-                )
-                first = False
-            writer.write_table(table)
+        con.execute(f"PRAGMA threads={threads}")
+        con.execute("PRAGMA preserve_insertion_order=false")
+        # store_rejects: linhas malformadas são puladas e registradas em reject_errors
+        con.execute(f"""
+            COPY (
+              SELECT {select_list(names, base)}
+              FROM read_csv('{src}',
+                            delim='{CSV_DELIM}', quote='{CSV_QUOTE}', header={str(skip_header).lower()},
+                            columns={columns}, encoding='{ENCODING_READ}', store_rejects=true)
+              {order_by}
+            ) TO '{dst}' (FORMAT PARQUET, COMPRESSION {PARQUET_COMPRESSION},
+                          COMPRESSION_LEVEL {PARQUET_COMPRESSION_LEVEL}, ROW_GROUP_SIZE {ROW_GROUP_SIZE})
+        """)
+        # reject_errors tem 1 registro por erro (uma linha curta gera um por coluna faltante)
+        rejected = con.execute("SELECT COUNT(DISTINCT (file_id, line)) FROM reject_errors").fetchone()[0]
+        rejects_path = parquet_path.with_suffix(".rejects.csv")
+        rejects_path.unlink(missing_ok=True)  # sobra de uma execução anterior
+        if rejected:
+            # um arquivo truncado/mal codificado viraria um Parquet menor com cara de válido:
+            # grava as linhas perdidas para inspeção e, acima do limite, descarta o Parquet
+            con.execute(f"COPY reject_errors TO '{str(rejects_path).replace(chr(92), '/')}' (HEADER)")
+            print(f"    [WARN] {rejected} linha(s) malformada(s) → {rejects_path.name}")
+            if rejected > max_rejects:
+                parquet_path.unlink(missing_ok=True)
+                raise RuntimeError(f"{csv_path.name}: {rejected} linha(s) rejeitada(s) "
+                                   f"(limite --max-rejects {max_rejects}); veja {rejects_path}")
     finally:
-        if writer is not None:
-            writer.close()
+        con.close()
 
 # --------------------- Pipeline de um ZIP ---------------------
 
-def process_one_zip(zip_url: str, work_dir: Path, out_dir: Path, keep_zip: bool, keep_csv: bool):
+def paths_for_zip(zip_url: str, work_dir: Path, out_dir: Path):
     zip_name = zip_url.rstrip("/").split("/")[-1]
     stem = Path(zip_name).stem
-    zip_path = work_dir / "zips" / zip_name
-    csv_dir = work_dir / "csv_tmp"
-    parquet_path = out_dir / f"{stem}.parquet"
+    return work_dir / "zips" / zip_name, out_dir / f"{stem}.parquet"
+
+def fetch_zip(zip_url: str, work_dir: Path, out_dir: Path):
+    """Baixa 1 zip (se não existir ou estiver corrompido). Retorna None se o Parquet já existe."""
+    zip_path, parquet_path = paths_for_zip(zip_url, work_dir, out_dir)
 
     if parquet_path.exists():
-        print(f"[SKIP] Já existe Parquet para {zip_name}: {parquet_path.name}")
-        return
+        print(f"[SKIP] Já existe Parquet para {zip_path.name}: {parquet_path.name}")
+        return None
 
     # download (com verificação de integridade)
     if zip_path.exists():
@@ -312,8 +453,28 @@ def process_one_zip(zip_url: str, work_dir: Path, out_dir: Path, keep_zip: bool,
         print(f"[BAIXANDO] {zip_url}")
         download_file(zip_url, zip_path)
         print(f"  -> {zip_path.name} ({human(zip_path.stat().st_size)})")
+    return zip_path
+
+def unzipped_size(zip_path: Path) -> int:
+    with zipfile.ZipFile(zip_path, 'r') as z:
+        return sum(i.file_size for i in z.infolist())
+
+def check_disk_for_unzip(zip_path: Path, extract_dir: Path):
+    """Falha antes de extrair se o CSV descompactado não cabe no disco do work dir."""
+    needed = unzipped_size(zip_path)
+    free = shutil.disk_usage(extract_dir).free
+    if needed > free:
+        raise RuntimeError(f"Espaço insuficiente p/ extrair {zip_path.name}: "
+                           f"precisa {human(needed)}, livre {human(free)}")
+
+def convert_zip(zip_path: Path, parquet_path: Path, work_dir: Path, keep_zip: bool, keep_csv: bool,
+                threads: int = DUCKDB_THREADS, max_rejects: int = MAX_REJECTS):
+    """Extrai o CSV do zip, converte para Parquet e limpa temporários conforme flags."""
+    csv_dir = work_dir / "csv_tmp"
+    ensure_dir(csv_dir)
 
     # unzip
+    check_disk_for_unzip(zip_path, csv_dir)
     print(f"[EXTRAINDO] {zip_path.name}")
     csv_path = unzip_single_csv(zip_path, csv_dir)
     print(f"  -> {csv_path.name} ({human(csv_path.stat().st_size)})")
@@ -321,7 +482,7 @@ def process_one_zip(zip_url: str, work_dir: Path, out_dir: Path, keep_zip: bool,
     # csv → parquet (com nomes corretos)
     print(f"[CONVERTENDO] {csv_path.name} -> {parquet_path.name}")
     t0 = time.time()
-    csv_to_parquet(csv_path, parquet_path)
+    csv_to_parquet(csv_path, parquet_path, threads, max_rejects)
     print(f"  -> OK em {time.time() - t0:.1f}s | {human(parquet_path.stat().st_size)}")
 
     # limpeza
@@ -330,6 +491,85 @@ def process_one_zip(zip_url: str, work_dir: Path, out_dir: Path, keep_zip: bool,
     if not keep_zip and zip_path.exists():
         zip_path.unlink()
 
+def process_one_zip(zip_url: str, work_dir: Path, out_dir: Path, keep_zip: bool, keep_csv: bool,
+                    max_rejects: int = MAX_REJECTS):
+    zip_path = fetch_zip(zip_url, work_dir, out_dir)
+    if zip_path is None:
+        return
+    _, parquet_path = paths_for_zip(zip_url, work_dir, out_dir)
+    convert_zip(zip_path, parquet_path, work_dir, keep_zip, keep_csv, max_rejects=max_rejects)
+
+def process_zips_parallel(zips, work_dir: Path, out_dir: Path, keep_zip: bool, keep_csv: bool,
+                          download_workers: int, convert_workers: int, max_rejects: int = MAX_REJECTS):
+    """
+    Produtor/consumidor: as threads baixam os zips e cada zip pronto é entregue ao pool
+    de processos para extração/conversão, enquanto os próximos ainda baixam.
+
+    O processo pai controla o disco: só começa uma conversão se o CSV descompactado cabe
+    no espaço livre menos o já reservado pelas conversões em andamento (senão espera uma
+    terminar), e no máximo download_workers + convert_workers zips ficam em disco
+    (baixando ou esperando conversão), então os downloads não se acumulam à frente.
+    """
+    csv_dir = work_dir / "csv_tmp"
+    ensure_dir(csv_dir)
+    max_in_flight = download_workers + convert_workers
+    pending = iter(zips)
+    downloading = {}   # future -> zip_url
+    ready = deque()    # (zip_url, zip_path, bytes do CSV) esperando conversão
+    converting = {}    # future -> (zip_url, bytes reservados)
+    reserved = 0
+
+    with ThreadPoolExecutor(max_workers=download_workers) as downloads, \
+         ProcessPoolExecutor(max_workers=convert_workers) as conversions:
+        while True:
+            # novos downloads só enquanto há vaga na fila baixando/esperando/convertendo
+            while len(downloading) + len(ready) + len(converting) < max_in_flight:
+                zip_url = next(pending, None)
+                if zip_url is None:
+                    break
+                downloading[downloads.submit(fetch_zip, zip_url, work_dir, out_dir)] = zip_url
+
+            # conversões: reserva o tamanho do CSV antes de submeter
+            while ready and len(converting) < convert_workers:
+                zip_url, zip_path, needed = ready[0]
+                free = shutil.disk_usage(csv_dir).free - reserved
+                if needed > free:
+                    if converting:
+                        break  # espera uma conversão terminar e liberar espaço
+                    ready.popleft()
+                    print(f"[ERRO] Espaço insuficiente p/ extrair {zip_path.name}: "
+                          f"precisa {human(needed)}, livre {human(free)}")
+                    continue
+                ready.popleft()
+                reserved += needed
+                _, parquet_path = paths_for_zip(zip_url, work_dir, out_dir)
+                job = conversions.submit(convert_zip, zip_path, parquet_path, work_dir,
+                                         keep_zip, keep_csv, DUCKDB_THREADS_PER_WORKER, max_rejects)
+                converting[job] = (zip_url, needed)
+
+            if not downloading and not converting:
+                if not ready:
+                    break
+                continue  # o que sobrou em ready é tratado na volta (sem conversões rodando)
+
+            done, _ = wait(list(downloading) + list(converting), return_when=FIRST_COMPLETED)
+            for fut in done:
+                if fut in downloading:
+                    zip_url = downloading.pop(fut)
+                    try:
+                        zip_path = fut.result()
+                        if zip_path is not None:
+                            ready.append((zip_url, zip_path, unzipped_size(zip_path)))
+                    except Exception as e:
+                        print(f"[ERRO] Falha ao baixar {zip_url}: {e}")
+                else:
+                    zip_url, needed = converting.pop(fut)
+                    reserved -= needed
+                    try:
+                        fut.result()
+                    except Exception as e:
+                        print(f"[ERRO] Falha ao processar {zip_url}: {e}")
+
 
 # ===================== CLI =====================
 
@@ -351,6 +591,13 @@ def main():
                         help="Processa apenas zips cujo nome contenha esta regex (ex.: 'Empresas|Estabelecimentos').")
     parser.add_argument("--limit", type=int, default=0,
                         help="Processa no máximo N arquivos.")
+    parser.add_argument("--workers", type=int, default=CONVERT_WORKERS,
+                        help=f"Processos de conversão em paralelo (padrão: {CONVERT_WORKERS}; 1 = sequencial).")
+    parser.add_argument("--download-workers", type=int, default=DOWNLOAD_WORKERS,
+                        help=f"Downloads simultâneos quando --workers > 1 (padrão: {DOWNLOAD_WORKERS}).")
+    parser.add_argument("--max-rejects", type=int, default=MAX_REJECTS,
+                        help=f"Linhas malformadas toleradas por arquivo; acima disso a conversão falha "
+                             f"(padrão: {MAX_REJECTS}). As rejeitadas vão para <arquivo>.rejects.csv.")
     args = parser.parse_args()
 
     work_dir = Path(args.work_dir).resolve()
@@ -378,6 +625,13 @@ def main():
         zips = zips[:args.limit]
 
     print(f"[INFO] {len(zips)} arquivos para processar.")
+    if args.workers > 1:
+        print(f"[INFO] Paralelo: {args.download_workers} downloads, {args.workers} conversões.")
+        process_zips_parallel(zips, work_dir, out_dir, args.keep_zip, args.keep_csv,
+                              args.download_workers, args.workers, args.max_rejects)
+        print("\n[OK] Finalizado.")
+        return
+
     for i, zip_url in enumerate(zips, start=1):
         print(f"\n=== ({i}/{len(zips)}) ===")
         try:
@@ -386,7 +640,8 @@ def main():
                 work_dir=work_dir,
                 out_dir=out_dir,
                 keep_zip=args.keep_zip,
-                keep_csv=args.keep_csv
+                keep_csv=args.keep_csv,
+                max_rejects=args.max_rejects
             )
         except Exception as e:
             print(f"[ERRO] Falha ao processar {zip_url}: {e}")
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# Regrava os Parquet ordenados por cnpj_basico, com row groups menores.
+# Com os dados ordenados, o min/max de cada row group fica estreito e uma consulta
+# por CNPJ (consultas/consulta_por_cnpj.py) lê ~1 row group por arquivo.
+# Trata: Empresas*, Simples*, Socios* (e Estabelecimentos* só com --incluir-estabelecimentos).
+# Estabelecimentos fica de fora por padrão: a ingestão (cnpj_ingest_duckdb_v2.py,
+# ESTABELECIMENTOS_ORDER_BY) já o grava agrupado por uf/municipio/cnae_fiscal_principal,
+# e é esse agrupamento que deixa os filtros das consultas pularem row groups. Reordenar
+# por cnpj_basico acelera a busca por CNPJ mas desfaz essa poda.
+
+import argparse, os, tempfile
+from glob import glob
+import duckdb
+
+ROW_GROUP_SIZE = 100_000
+
+SQL_ORDENA = """
+COPY (
+  SELECT *
+  FROM read_parquet('{src}')
+  ORDER BY cnpj_basico
+) TO '{dst}' (FORMAT PARQUET, COMPRESSION 'ZSTD', ROW_GROUP_SIZE {row_group_size});
+"""
+
+def detect_kind(path: str) -> str:
+    b = os.path.basename(path).lower()
+    if "empresas" in b: return "empresas"
+    if "estabelec" in b: return "estabelecimentos"
+    if "simples" in b: return "simples"
+    if "socios" in b or "sócios" in b: return "socios"
+    return ""
+
+def main():
+    ap = argparse.ArgumentParser(description="Ordena Parquet por cnpj_basico (Empresas/Simples/Socios; Estabelecimentos opcional).")
+    ap.add_argument("--src", required=True, help="Pasta de origem (recursiva).")
+    ap.add_argument("--dst", help="Pasta de destino; se omitir e usar --inplace, sobrescreve no lugar.")
+    ap.add_argument("--inplace", action="store_true", help="Sobrescreve os arquivos no lugar (usa arquivo temporário).")
+    ap.add_argument("--row-group-size", type=int, default=ROW_GROUP_SIZE,
+                    help=f"Linhas por row group (padrão: {ROW_GROUP_SIZE}).")
+    ap.add_argument("--incluir-estabelecimentos", action="store_true",
+                    help="Também reordena Estabelecimentos* por cnpj_basico. Acelera a busca por CNPJ, "
+                         "mas desfaz o agrupamento uf/municipio/cnae gravado pelo cnpj_ingest_duckdb_v2.py, "
+                         "usado pelos filtros das consultas.")
+    args = ap.parse_args()
+
+    src_dir = os.path.abspath(args.src)
+    if not os.path.isdir(src_dir):
+        raise SystemExit(f"Pasta não encontrada: {src_dir}")
+
+    if args.inplace:
+        dst_dir = None
+    else:
+        dst_dir = os.path.abspath(args.dst) if args.dst else (src_dir.rstrip('/\\') + "_ordenado")
+        os.makedirs(dst_dir, exist_ok=True)
+
+    files = glob(os.path.join(src_dir, "**", "*.parquet"), recursive=True)
+    if not files:
+        raise SystemExit("Nenhum .parquet encontrado.")
+
+    con = duckdb.connect(database=":memory:")
+
+    for src in files:
+        kind = detect_kind(src)
+        if not kind:
+            continue
+        if kind == "estabelecimentos" and not args.incluir_estabelecimentos:
+            print(f"[=] Mantido (agrupado por uf/municipio/cnae): {src}")
+            continue
+
+        if args.inplace:
+            fd, out = tempfile.mkstemp(prefix=".__tmp__", suffix=".parquet", dir=os.path.dirname(src))
+            os.close(fd)
+        else:
+            rel = os.path.relpath(src, src_dir)
+            out = os.path.join(dst_dir, rel)
+            os.makedirs(os.path.dirname(out), exist_ok=True)
+
+        print(f"[+] Ordenando {kind}: {src}")
+        try:
+            con.execute(SQL_ORDENA.format(
+                src=src.replace("\\", "/"), dst=out.replace("\\", "/"),
+                row_group_size=args.row_group_size,
+            ))
+            print(f"    ✔ Gravado: {out}")
+        except Exception as e:
+            print(f"    ✖ ERRO: {e}")
+            if args.inplace and os.path.exists(out):
+                try: os.remove(out)
+                except OSError: pass
+            continue
+
+        if args.inplace:
+            try:
+                os.replace(out, src)
+                print("    → Substituído in-place.")
+            except Exception as e:
+                print(f"    ✖ ERRO ao substituir: {e}")
+                try: os.remove(out)
+                except OSError: pass
+
+    con.close()
+    print("\nConcluído.")
+
+if __name__ == "__main__":
+    main()
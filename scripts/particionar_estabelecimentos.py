@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# particionar_estabelecimentos.py
+# Regrava Estabelecimentos*.parquet como dataset Hive particionado por UF:
+#   data/cnpj_hive/uf=MG/data_0.parquet, data/cnpj_hive/uf=SP/..., ...
+# Com o dataset particionado, filtros por UF abrem só os arquivos da UF pedida.
+# Uso:
+#   python scripts/particionar_estabelecimentos.py --parquet-dir data/cnpj_parquet --out-dir data/cnpj_hive
+#   py ./consultas/consulta_cnpj_filtrada.py --parquet-dir data/cnpj_parquet --hive-dir data/cnpj_hive --uf MG
+
+import argparse, os, time
+from glob import glob
+import duckdb
+
+SQL_PARTICIONA = """
+COPY (
+  SELECT *
+  FROM read_parquet('{src}')
+) TO '{dst}' (FORMAT PARQUET, COMPRESSION 'ZSTD', PARTITION_BY (uf){overwrite});
+"""
+
+def main():
+    ap = argparse.ArgumentParser(description="Particiona Estabelecimentos*.parquet por UF (layout Hive).")
+    ap.add_argument("--parquet-dir", required=True, help="Pasta com os Estabelecimentos*.parquet.")
+    ap.add_argument("--out-dir", default="data/cnpj_hive", help="Pasta de saída do dataset particionado.")
+    ap.add_argument("--overwrite", action="store_true", help="Sobrescreve partições já existentes na saída.")
+    args = ap.parse_args()
+
+    t0 = time.perf_counter()
+    base = os.path.abspath(args.parquet_dir).replace("\\", "/")
+    out_dir = os.path.abspath(args.out_dir).replace("\\", "/")
+    est_glob = f"{base}/Estabelecimentos*.parquet"
+
+    if not glob(est_glob):
+        raise SystemExit("❌ Estabelecimentos*.parquet não encontrado.")
+    if os.path.isdir(out_dir) and os.listdir(out_dir) and not args.overwrite:
+        raise SystemExit(f"❌ Pasta de saída não está vazia: {out_dir} (use --overwrite).")
+    os.makedirs(out_dir, exist_ok=True)
+
+    print("▶️  Particionando Estabelecimentos por UF…")
+    print(f"   • Origem : {est_glob}")
+    print(f"   • Destino: {out_dir}")
+
+    con = duckdb.connect(database=":memory:")
+    con.execute(SQL_PARTICIONA.format(
+        src=est_glob, dst=out_dir,
+        overwrite=", OVERWRITE_OR_IGNORE" if args.overwrite else "",
+    ))
+    con.close()
+
+    parts = sorted(os.listdir(out_dir))
+    dt = time.perf_counter() - t0
+    mm, ss = divmod(int(dt), 60)
+    print("✅ Concluído.")
+    print(f"   • Partições       : {len(parts)}")
+    print(f"   • Tempo decorrido : {mm:02d}:{ss:02d} (mm:ss)")
+
+if __name__ == "__main__":
+    main()
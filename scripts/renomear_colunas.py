@@ -1,11 +1,15 @@
 #!/usr/bin/env python3
 # renomear_parquet_stream_dict_receita.py
-import argparse, os, re, tempfile, shutil
+import argparse, os, re, tempfile, shutil, struct, base64, functools
 from glob import glob
 from unidecode import unidecode
 import pyarrow as pa
 import pyarrow.parquet as pq
 
+# Pools do Arrow (decodificação/IO do Parquet) com todos os núcleos
+pa.set_cpu_count(os.cpu_count() or 1)
+pa.set_io_thread_count(os.cpu_count() or 1)
+
 # ===== Mapas oficiais → snake_case =====
 # (Empresas/Estabelecimentos/Simples INTENCIONALMENTE omitidos por padrão)
 
@@ -43,6 +47,7 @@ MAPAS = {
 }
 
 # ===== Helpers de nome =====
+@functools.lru_cache(maxsize=None)
 def to_sql_name(raw: str) -> str:
     s = unidecode(str(raw)).lower().strip()
     s = re.sub(r"[^a-z0-9]+", "_", s)
@@ -62,7 +67,8 @@ def unique(names):
             out.append(f"{n}_{seen[n]}")
     return out
 
-def auto_sql_headers(cols):
+@functools.lru_cache(maxsize=None)
+def auto_sql_headers(cols: tuple):
     res = []
     for i, c in enumerate(cols):
         n = to_sql_name(c)
@@ -75,28 +81,24 @@ def normaliza_nome_arquivo(path: str) -> str:
     base = os.path.splitext(os.path.basename(path))[0]
     return unidecode(base).lower()
 
+# Palavras-chave no nome do arquivo, em ordem de prioridade (a 1ª que aparecer vence).
+# O nome já passa por unidecode().lower(), então basta a grafia sem acento.
+BASES_RE = re.compile(
+    r"^(?:.*(?P<socios>socios)"
+    r"|.*(?P<paises>pais)"
+    r"|.*(?P<municipios>municipio)"
+    r"|.*(?P<qualificacoes>qualificacoes)"
+    r"|.*(?P<naturezas>naturezas)"
+    r"|.*(?P<cnaes>cnae)"
+    r"|.*(?P<empresas>empresas)"
+    r"|.*(?P<estabelecimentos>estabelec)"
+    r"|.*(?P<simples>simples))",
+    re.DOTALL,
+)
+
 def detectar_base(path: str) -> str:
-    b = normaliza_nome_arquivo(path)
-    # procura palavras-chave no nome do arquivo
-    if "socios" in b or "sócios" in b:
-        return "socios"
-    if "paises" in b or "países" in b or "pais" in b:
-        return "paises"
-    if "municipios" in b or "municípios" in b or "municipio" in b:
-        return "municipios"
-    if "qualificacoes" in b or "qualificações" in b:
-        return "qualificacoes"
-    if "naturezas" in b:
-        return "naturezas"
-    if "cnaes" in b or "cnae" in b:
-        return "cnaes"
-    if "empresas" in b:
-        return "empresas"
-    if "estabelec" in b:
-        return "estabelecimentos"
-    if "simples" in b:
-        return "simples"
-    return ""
+    m = BASES_RE.match(normaliza_nome_arquivo(path))
+    return m.lastgroup if m else ""
 
 def decidir_novos_nomes(path: str, schema: pa.Schema, include_ees: bool):
     base = detectar_base(path)
@@ -107,43 +109,231 @@ def decidir_novos_nomes(path: str, schema: pa.Schema, include_ees: bool):
     if alvo and len(alvo) == len(schema.names):
         return alvo, base
     # fallback genérico
-    return auto_sql_headers(schema.names), base
+    return auto_sql_headers(tuple(schema.names)), base
 
 # ===== Renomeio em streaming =====
-def renomear_parquet_streaming(src_path: str, dst_path: str, novos_nomes, compression: str = "zstd"):
+BATCH_SIZE = 131_072  # linhas por lote lido (os lotes de um row group voltam a formar 1 row group na saída)
+
+def renomear_parquet_streaming(src_path: str, dst_path: str, novos_nomes, compression: str = "zstd",
+                               compression_level: int = 1):
     import os
     import pyarrow as pa
     import pyarrow.parquet as pq
 
-    pf = pq.ParquetFile(src_path)
+    pf = pq.ParquetFile(src_path, memory_map=True)  # páginas lidas direto do page cache, sem cópia p/ buffer
     old_schema = pf.schema_arrow
 
-    # monta schema novo preservando os tipos originais
-    new_fields = [pa.field(novos_nomes[i], old_schema.types[i]) for i in range(len(old_schema))]
-    new_schema = pa.schema(new_fields)
+    # schema novo: só troca os nomes (tipo, nulabilidade e metadados de cada campo ficam)
+    new_schema = pa.schema([f.with_name(n) for f, n in zip(old_schema, novos_nomes)],
+                           metadata=old_schema.metadata)
 
     os.makedirs(os.path.dirname(dst_path), exist_ok=True)
     writer = pq.ParquetWriter(
         dst_path,
         new_schema,
         compression=compression,
+        compression_level=compression_level,
         use_dictionary=True,
+        data_page_size=1 << 20,
+        dictionary_pagesize_limit=1 << 20,
+        write_batch_size=8192,
     )
 
-    # lê e escreve por row group, renomeando as colunas da TABELA (sem lidar com arrays individuais)
+    # um row group de saída por row group de origem (mantém compressão e min/max da poda);
+    # o rename só troca os nomes, então os buffers decodificados vão direto pro writer
     for rg in range(pf.num_row_groups):
-        tbl = pf.read_row_group(rg)
-        # garante arrays consolidadas (evita problemas com chunks esquisitos)
-        if hasattr(tbl, "combine_chunks"):
-            tbl = tbl.combine_chunks()
-        # renomeia as colunas da tabela inteira de uma vez
-        tbl = tbl.rename_columns(novos_nomes)
-        writer.write_table(tbl)  # escreve este row group
+        batches = [pa.RecordBatch.from_arrays(b.columns, schema=new_schema)
+                   for b in pf.iter_batches(batch_size=BATCH_SIZE, row_groups=[rg], use_threads=True)]
+        tabela = pa.Table.from_batches(batches, schema=new_schema)
+        if tabela.num_rows:
+            writer.write_table(tabela, row_group_size=tabela.num_rows)
 
     writer.close()
     return old_schema.names
 
 
+# ===== Renomeio só no rodapé (sem reescrever os dados) =====
+# Os nomes das colunas ficam no rodapé do Parquet (FileMetaData, Thrift compact). Para um
+# arquivo "plano" (sem colunas aninhadas) basta trocar SchemaElement.name,
+# ColumnMetaData.path_in_schema e o ARROW:schema guardado no key_value_metadata; as
+# páginas de dados ficam byte a byte iguais.
+
+# Tipos do Thrift compact protocol
+_T_TRUE, _T_FALSE, _T_BYTE, _T_I16, _T_I32, _T_I64, _T_DOUBLE, _T_BINARY, _T_LIST, _T_SET, _T_MAP, _T_STRUCT = range(1, 13)
+
+def _tc_varint(b, i):
+    val = shift = 0
+    while True:
+        x = b[i]; i += 1
+        val |= (x & 0x7F) << shift
+        if not x & 0x80:
+            return val, i
+        shift += 7
+
+def _tc_put_varint(out, v):
+    while v > 0x7F:
+        out.append((v & 0x7F) | 0x80)
+        v >>= 7
+    out.append(v)
+
+def _tc_read_value(b, i, t):
+    # inteiros ficam como o varint cru (zigzag): só são regravados, nunca interpretados
+    if t in (_T_TRUE, _T_FALSE, _T_BYTE):
+        return b[i], i + 1
+    if t in (_T_I16, _T_I32, _T_I64):
+        return _tc_varint(b, i)
+    if t == _T_DOUBLE:
+        return b[i:i + 8], i + 8
+    if t == _T_BINARY:
+        n, i = _tc_varint(b, i)
+        return b[i:i + n], i + n
+    if t in (_T_LIST, _T_SET):
+        h = b[i]; i += 1
+        n, et = h >> 4, h & 0x0F
+        if n == 15:
+            n, i = _tc_varint(b, i)
+        items = []
+        for _ in range(n):
+            v, i = _tc_read_value(b, i, et)
+            items.append(v)
+        return [et, items], i
+    if t == _T_MAP:
+        n, i = _tc_varint(b, i)
+        kt = vt = 0
+        pairs = []
+        if n:
+            kt, vt = b[i] >> 4, b[i] & 0x0F; i += 1
+            for _ in range(n):
+                k, i = _tc_read_value(b, i, kt)
+                v, i = _tc_read_value(b, i, vt)
+                pairs.append((k, v))
+        return [kt, vt, pairs], i
+    if t == _T_STRUCT:
+        return _tc_read_struct(b, i)
+    raise ValueError(f"tipo Thrift desconhecido: {t}")
+
+def _tc_read_struct(b, i):
+    """Struct como lista de [field_id, tipo, valor] (bool de campo: valor None, tipo diz true/false)."""
+    fields, last = [], 0
+    while True:
+        h = b[i]; i += 1
+        if h == 0:
+            return fields, i
+        t, delta = h & 0x0F, h >> 4
+        if delta:
+            fid = last + delta
+        else:
+            z, i = _tc_varint(b, i)
+            fid = (z >> 1) ^ -(z & 1)
+        val = None
+        if t not in (_T_TRUE, _T_FALSE):
+            val, i = _tc_read_value(b, i, t)
+        fields.append([fid, t, val])
+        last = fid
+
+def _tc_write_value(out, t, v):
+    if t in (_T_TRUE, _T_FALSE, _T_BYTE):
+        out.append(v)
+    elif t in (_T_I16, _T_I32, _T_I64):
+        _tc_put_varint(out, v)
+    elif t == _T_DOUBLE:
+        out += v
+    elif t == _T_BINARY:
+        _tc_put_varint(out, len(v)); out += v
+    elif t in (_T_LIST, _T_SET):
+        et, items = v
+        if len(items) < 15:
+            out.append((len(items) << 4) | et)
+        else:
+            out.append(0xF0 | et); _tc_put_varint(out, len(items))
+        for x in items:
+            _tc_write_value(out, et, x)
+    elif t == _T_MAP:
+        kt, vt, pairs = v
+        _tc_put_varint(out, len(pairs))
+        if pairs:
+            out.append((kt << 4) | vt)
+            for k, x in pairs:
+                _tc_write_value(out, kt, k); _tc_write_value(out, vt, x)
+    elif t == _T_STRUCT:
+        _tc_write_struct(out, v)
+
+def _tc_write_struct(out, fields):
+    last = 0
+    for fid, t, val in fields:
+        if 0 < fid - last <= 15:
+            out.append(((fid - last) << 4) | t)
+        else:
+            out.append(t); _tc_put_varint(out, (fid << 1) ^ (fid >> 63))
+        if t not in (_T_TRUE, _T_FALSE):
+            _tc_write_value(out, t, val)
+        last = fid
+    out.append(0)
+
+def _tc_field(fields, fid):
+    for f in fields:
+        if f[0] == fid:
+            return f
+    return None
+
+def renomear_parquet_rodape(src_path: str, dst_path: str, novos_nomes):
+    """
+    Copia o arquivo e regrava só o rodapé com os nomes novos (sem decodificar páginas).
+    Levanta ValueError se o arquivo não for plano/suportado (aí usa-se o streaming).
+    """
+    with open(src_path, "rb") as f:
+        f.seek(-8, os.SEEK_END)
+        tail = f.read(8)
+        if tail[4:] != b"PAR1":
+            raise ValueError("rodapé criptografado ou arquivo não-Parquet")
+        footer_len = struct.unpack("<I", tail[:4])[0]
+        f.seek(-8 - footer_len, os.SEEK_END)
+        footer_start = f.tell()
+        footer = f.read(footer_len)
+
+    meta, _ = _tc_read_struct(footer, 0)
+    # FileMetaData: 2=schema, 4=row_groups, 5=key_value_metadata
+    schema = _tc_field(meta, 2)[2][1]
+    root, leaves = schema[0], schema[1:]
+    if len(leaves) != len(novos_nomes) or any(_tc_field(el, 5) for el in leaves):
+        raise ValueError("schema aninhado ou nº de colunas diferente")
+
+    old_names = []
+    for el, nome in zip(leaves, novos_nomes):  # SchemaElement: 4=name
+        name_f = _tc_field(el, 4)
+        old_names.append(name_f[2].decode("utf-8"))
+        name_f[2] = nome.encode("utf-8")
+
+    for rg in _tc_field(meta, 4)[2][1]:               # RowGroup: 1=columns
+        for col, nome in zip(_tc_field(rg, 1)[2][1], novos_nomes):
+            cmd = _tc_field(col, 3)                   # ColumnChunk: 3=meta_data
+            if cmd is None:
+                raise ValueError("column chunk sem meta_data")
+            _tc_field(cmd[2], 3)[2][1] = [nome.encode("utf-8")]  # ColumnMetaData: 3=path_in_schema
+
+    kv = _tc_field(meta, 5)
+    if kv is not None:                                # KeyValue: 1=key, 2=value
+        for item in kv[2][1]:
+            if _tc_field(item, 1)[2] == b"ARROW:schema":
+                old_schema = pq.ParquetFile(src_path).schema_arrow
+                new_schema = pa.schema([f.with_name(n) for f, n in zip(old_schema, novos_nomes)],
+                                       metadata=old_schema.metadata)
+                _tc_field(item, 2)[2] = base64.b64encode(new_schema.serialize().to_pybytes())
+
+    new_footer = bytearray()
+    _tc_write_struct(new_footer, meta)
+
+    os.makedirs(os.path.dirname(dst_path), exist_ok=True)
+    shutil.copyfile(src_path, dst_path)
+    with open(dst_path, "r+b") as f:
+        f.seek(footer_start)
+        f.write(new_footer)
+        f.write(struct.pack("<I", len(new_footer)))
+        f.write(b"PAR1")
+        f.truncate()
+    return old_names
+
+
 def main():
     ap = argparse.ArgumentParser(description="Renomeia colunas dos .parquet conforme dicionário da Receita (streaming).")
     ap.add_argument("--src", required=True, help="Pasta origem (recursivo).")
@@ -204,7 +394,11 @@ def main():
                         print("    Aviso: --delete-source sem efeito para arquivos pulados em --inplace.")
                 continue
 
-            old_cols = renomear_parquet_streaming(src_path, out_path, novos_nomes)
+            try:
+                old_cols = renomear_parquet_rodape(src_path, out_path, novos_nomes)
+            except ValueError as e:
+                print(f"    (rodapé não suportado: {e} — regravando em streaming)")
+                old_cols = renomear_parquet_streaming(src_path, out_path, novos_nomes)
             print(f"[✔] Gravado: {out_path}")
             print("    Renomeações (origem → destino):")
             for o, n in zip(old_cols, novos_nomes):
@@ -1,47 +1,178 @@
 import requests
 import os
+import json
+import time
+import hashlib
+import logging
+import tempfile
+from types import MappingProxyType
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from urllib3.util.request import ACCEPT_ENCODING
 
-load_dotenv()
+try:
+    import orjson  # opcional: decodifica bem mais rápido que o json da stdlib
+except ImportError:
+    orjson = None
+
+# .env só é lido se o token não veio do ambiente (quem exporta o token configura
+# as demais CNPJ_* no ambiente também); poupa a busca do arquivo em execuções curtas
+if os.getenv("CNPJ_API_TOKEN") is None:
+    load_dotenv()
 
 API_TOKEN = os.getenv("CNPJ_API_TOKEN")
-HEADERS = {"x_api_token": API_TOKEN, "Accept": "application/json"}
+# JSON comprime muito bem; ACCEPT_ENCODING do urllib3 já inclui "br" quando o pacote
+# brotli está instalado, então só anunciamos o que conseguimos decodificar
+HEADERS = MappingProxyType({"x_api_token": API_TOKEN, "Accept": "application/json",
+                            "Accept-Encoding": ACCEPT_ENCODING})
 SEARCH_URL = "https://comercial.cnpj.ws/pesquisa"
+PAGINAS_SIMULTANEAS = 5  # requisições em paralelo depois da 1ª página
+
+logger = logging.getLogger(__name__)
+
+# Cache em disco das páginas já buscadas (mesmos filtros + página), válido por CACHE_TTL_HORAS.
+# CNPJ_CACHE_TTL_HORAS=0 desliga o cache.
+CACHE_DIR = os.getenv("CNPJ_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "lead2lead"))
+CACHE_TTL_HORAS = float(os.getenv("CNPJ_CACHE_TTL_HORAS", "12"))
+
+# Sessão compartilhada: reaproveita as conexões TLS entre páginas e entre pesquisas
+SESSION = requests.Session()
+# 429/5xx são repetidos no próprio adapter, com backoff exponencial e respeitando Retry-After
+SESSION.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16,
+                                      max_retries=Retry(total=5, backoff_factor=0.5,
+                                                        status_forcelist=[429, 500, 502, 503, 504],
+                                                        respect_retry_after_header=True,
+                                                        raise_on_status=False)))
+# sem token (None) o header é omitido, como acontecia com headers=HEADERS por requisição
+SESSION.headers.update({k: v for k, v in HEADERS.items() if v is not None})
+
+
+class ErroPesquisaCNPJ(Exception):
+    """Página que falhou mesmo depois dos retries. Guarda o que já foi coletado
+    (resultados das páginas anteriores) para o chamador poder retomar dali;
+    com on_batch essas páginas já foram entregues e resultados vem vazio."""
+
+    def __init__(self, pagina, status_code, resultados):
+        super().__init__(f"página {pagina} falhou com HTTP {status_code}")
+        self.pagina = pagina
+        self.status_code = status_code
+        self.resultados = resultados
+
+
+def _caminho_cache(params):
+    chave = json.dumps([SEARCH_URL, sorted(params.items())], default=str, ensure_ascii=False)
+    return os.path.join(CACHE_DIR, hashlib.blake2b(chave.encode("utf-8"), digest_size=16).hexdigest() + ".json")
+
+
+def _ler_cache(caminho):
+    if CACHE_TTL_HORAS <= 0:
+        return None
+    try:
+        if time.time() - os.path.getmtime(caminho) > CACHE_TTL_HORAS * 3600:
+            return None
+        with open(caminho, "rb") as f:
+            return orjson.loads(f.read()) if orjson else json.load(f)
+    except (OSError, ValueError):
+        return None
 
 
-def pesquisar_empresas(filtros, max_paginas=5):
+def _gravar_cache(caminho, conteudo):
+    if CACHE_TTL_HORAS <= 0:
+        return
+    tmp = None
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        # grava num temporário e renomeia: outra thread nunca lê um JSON pela metade
+        fd, tmp = tempfile.mkstemp(dir=CACHE_DIR, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(conteudo)
+        os.replace(tmp, caminho)
+    except OSError as e:
+        logger.warning("Não foi possível gravar o cache %s: %s", caminho, e)
+        if tmp is not None:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+
+
+def _buscar_pagina(filtros, pagina):
+    """Retorna (response, body); body só é decodificado se a resposta for 200.
+    Página em cache (ainda válida) volta como (None, body), sem ir à API."""
+    params = {**filtros, "pagina": pagina}
+    caminho = _caminho_cache(params)
+    body = _ler_cache(caminho)
+    if body is not None:
+        return None, body
+
+    response = SESSION.get(SEARCH_URL, params=params, timeout=30)
+    if response.status_code != 200:
+        return response, None
+    body = orjson.loads(response.content) if orjson else response.json()
+    _gravar_cache(caminho, response.content)
+    return response, body
+
+
+def _projetar(lista, _g=dict.get, _vazio={}):
+    # dict.get como local (sem lookup de método por campo); _vazio é só lido, nunca alterado
+    return [{
+        "cnpj": _g(item, "cnpj"),
+        "razao_social": _g(item, "razao_social"),
+        "nome_fantasia": _g(item, "nome_fantasia", ""),
+        "uf": _g(item, "uf", ""),
+        "municipio": _g(item, "municipio", ""),
+        "situacao_cadastral": _g(item, "situacao_cadastral", ""),
+        "porte": _g(item, "porte", ""),
+        # "atividade_principal": null também acontece; trata como ausente
+        "cnae": _g(_g(item, "atividade_principal") or _vazio, "descricao", "")
+    } for item in lista]
+
+
+def _consumir_pagina(pagina, response, body, resultados, on_batch):
+    """Entrega os itens da página (on_batch ou resultados); False = parar a paginação."""
+    if body is None:
+        logger.warning("Erro na página %d: HTTP %s: %.200s", pagina, response.status_code, response.text)
+        raise ErroPesquisaCNPJ(pagina, response.status_code, resultados)
+    lista = body.get("data", [])
+    if not lista:
+        return False
+    if on_batch is None:
+        resultados.extend(_projetar(lista))
+    else:
+        on_batch(_projetar(lista))
+    return True
+
+
+def pesquisar_empresas(filtros, max_paginas=5, on_batch=None):
+    """Devolve a lista com as empresas de todas as páginas. Com on_batch, cada página
+    (lista de dicts, em ordem) vai para o callback assim que é projetada e nada é
+    acumulado: a lista devolvida fica vazia e a memória não cresce com max_paginas."""
     resultados = []
-    pagina = 1
-
-    while pagina <= max_paginas:
-        params = {**filtros, "pagina": pagina}
-        response = requests.get(SEARCH_URL, headers=HEADERS, params=params, timeout=30)
-
-        if response.status_code != 200:
-            print(f"Erro na página {pagina}: {response.status_code} text: {response.text}")
-            break
-
-        body = response.json()
-        lista = body.get("data", [])
-        if not lista:
-            break
-
-        for item in lista:
-            resultados.append({
-                "cnpj": item.get("cnpj"),
-                "razao_social": item.get("razao_social"),
-                "nome_fantasia": item.get("nome_fantasia", ""),
-                "uf": item.get("uf", ""),
-                "municipio": item.get("municipio", ""),
-                "situacao_cadastral": item.get("situacao_cadastral", ""),
-                "porte": item.get("porte", ""),
-                "cnae": item.get("atividade_principal", {}).get("descricao", "")
-            })
-
-        total_paginas = body.get("paginacao", {}).get("paginas", pagina)
-        if pagina >= total_paginas:
-            break
-
-        pagina += 1
+    if max_paginas < 1:
+        return resultados
+
+    # A 1ª página diz quantas existem; as demais (até max_paginas) saem em paralelo,
+    # então o tempo total fica ~2 RTT em vez de 1 RTT por página
+    response, primeira = _buscar_pagina(filtros, 1)
+    total_paginas = primeira.get("paginacao", {}).get("paginas", 1) if primeira is not None else 1
+    restantes = range(2, min(max_paginas, total_paginas) + 1)
+    if not restantes:
+        _consumir_pagina(1, response, primeira, resultados, on_batch)
+        return resultados
+
+    pool = ThreadPoolExecutor(max_workers=min(len(restantes), PAGINAS_SIMULTANEAS))
+    try:
+        futuros = [pool.submit(_buscar_pagina, filtros, p) for p in restantes]
+        # Projeta cada página enquanto as seguintes ainda estão chegando; processa
+        # em ordem e para na 1ª página vazia (ou erro), como na paginação sequencial
+        if _consumir_pagina(1, response, primeira, resultados, on_batch):
+            for pagina, futuro in enumerate(futuros, start=2):
+                if not _consumir_pagina(pagina, *futuro.result(), resultados, on_batch):
+                    break
+    finally:
+        # páginas depois de uma parada/erro não interessam: cancela as que nem começaram
+        pool.shutdown(wait=True, cancel_futures=True)
 
     return resultados